@@ -0,0 +1,14 @@
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+django.setup(set_prefix=False)
+
+from foodgram.handlers import PinnedThreadASGIHandler  # noqa: E402
+from recipes.ingredient_index import warm_up  # noqa: E402
+
+application = PinnedThreadASGIHandler()
+
+warm_up()
@@ -0,0 +1,127 @@
+"""ASGI handler running the synchronous part of a request in one thread.
+
+The stock ASGI handler of Django 3.0 runs the view through
+``sync_to_async`` but iterates a streaming response and sends the request
+signals in the event loop or in other threads. The ORM refuses to run in
+the event loop, so streaming the shopping cart from a server-side cursor
+fails, and database connections opened by a view are never closed.
+
+Here every request takes one thread out of a pool of ``ASGI_THREADS`` for
+its signals, view and streaming response, so all its ORM calls share one
+connection. The request body is read and a buffered response is sent by
+the event loop after the thread is returned, so slow clients hold only a
+coroutine, not a thread and a database connection.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signals
+from django.core.handlers.asgi import ASGIHandler
+from django.core.exceptions import RequestAborted
+from django.http import FileResponse
+from django.urls import set_script_prefix
+
+STREAM_END = object()
+
+
+class PinnedThreadASGIHandler(ASGIHandler):
+    def __init__(self):
+        super().__init__()
+        self.threads = None
+
+    async def take_thread(self):
+        if self.threads is None:
+            self.threads = asyncio.Queue()
+            for _ in range(settings.ASGI_THREADS):
+                self.threads.put_nowait(ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='asgi'
+                ))
+        return await self.threads.get()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            raise ValueError(
+                f'Django can only handle ASGI/HTTP connections, '
+                f'not {scope["type"]}.'
+            )
+        try:
+            body_file = await self.read_body(receive)
+        except RequestAborted:
+            return
+
+        thread = await self.take_thread()
+        loop = asyncio.get_running_loop()
+
+        def run(func, *args, **kwargs):
+            return loop.run_in_executor(
+                thread, functools.partial(func, *args, **kwargs)
+            )
+
+        try:
+            response = await run(self.get_response_for, scope, body_file)
+            if response.streaming:
+                await self.send_headers(response, send)
+                await self.send_stream(response, send, run)
+                return
+            await run(response.close)
+        finally:
+            self.threads.put_nowait(thread)
+        await self.send_headers(response, send)
+        for chunk, last in self.chunk_bytes(response.content):
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': not last,
+            })
+
+    def get_response_for(self, scope, body_file):
+        set_script_prefix(self.get_script_prefix(scope))
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        request, error_response = self.create_request(scope, body_file)
+        if request is None:
+            return error_response
+        response = self.get_response(request)
+        response._handler_class = self.__class__
+        if isinstance(response, FileResponse):
+            response.block_size = self.chunk_size
+        return response
+
+    async def send_headers(self, response, send):
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append(
+                (b'Set-Cookie', cookie.output(header='').encode('ascii')
+                 .strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+    async def send_stream(self, response, send, run):
+        """Sends a streaming response, producing each part in the thread of
+        the request."""
+        try:
+            parts = await run(iter, response)
+            while True:
+                part = await run(next, parts, STREAM_END)
+                if part is STREAM_END:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await run(response.close)
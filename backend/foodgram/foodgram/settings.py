@@ -22,6 +22,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipes.middleware.ServerTimingMiddleware',
+    'recipes.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -36,7 +38,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -46,8 +48,42 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 3
 }
 
+QUERY_BUDGET_ENFORCE = (
+    os.environ.get('QUERY_BUDGET_ENFORCE', 'false').lower() == 'true'
+)
+
+# warn logs queries repeated by a request, raise fails the request.
+NPLUSONE_MODE = os.environ.get('NPLUSONE_MODE', 'warn' if DEBUG else 'off')
+NPLUSONE_THRESHOLD = 3
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Links sent by djoser in emails, relative to the frontend domain.
+DJOSER = {
+    'PASSWORD_RESET_CONFIRM_URL': 'password/reset/{uid}/{token}',
+    'USERNAME_RESET_CONFIRM_URL': 'email/reset/{uid}/{token}',
+    'ACTIVATION_URL': 'activate/{uid}/{token}',
+}
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend'
+)
+DEFAULT_FROM_EMAIL = os.environ.get(
+    'DEFAULT_FROM_EMAIL', 'foodgram@example.com'
+)
+
+AUTH_TOKEN_CACHE_TTL = 30
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_SHARED_CACHE = (
+    os.environ.get('AUTH_TOKEN_SHARED_CACHE', 'false').lower() == 'true'
+)
+
+METRICS_FLUSH_INTERVAL = 10
+# If set, /api/metrics requires the header "Authorization: Bearer <token>".
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Threads of an ASGI worker running views, and so its database connections.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 10))
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -68,6 +104,15 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
 DATABASES = {
     'default': {
         'ENGINE': os.environ.get('DB_ENGINE'),
@@ -112,5 +157,33 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'django_static')
 
+INGREDIENT_SEARCH_LIMIT = 50
+
+SHOPPING_CART_PDF_FONT = os.environ.get(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+SHOPPING_CART_CACHE_MAX_SIZE = 1024 * 1024
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60 * 24
+
+TIMELINE_CELEBRITY_FOLLOWERS = int(
+    os.environ.get('TIMELINE_CELEBRITY_FOLLOWERS', 10000)
+)
+TIMELINE_BACKFILL = 100
+
+COOKABLE_REFRESH_INTERVAL = 60
+COOKABLE_RESULTS_LIMIT = 1000
+
+RECIPE_CACHE_TIMEOUT = 60 * 10
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 25 * 1000 * 1000)
+)
+# base64 makes a photo a third larger; the rest is the recipe itself.
+RECIPE_REQUEST_MAX_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'django_media')
@@ -12,11 +12,15 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'text', 'author', 'cooking_time',)
+    list_display = (
+        'name', 'text', 'author', 'cooking_time', 'favorites_count',
+    )
     search_fields = ('name',)
     list_filter = ('author',)
+    list_select_related = ('author',)
     empty_value_display = '-пусто-'
     exclude = ('ingredients',)
+    readonly_fields = ('favorites_count', 'shopping_carts_count',)
 
 
 @admin.register(Tag)
@@ -28,13 +32,20 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('follower', 'followee',)
+    list_select_related = ('follower', 'followee',)
 
 
 @admin.register(Bookmark)
 class BookmarkAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe',)
 
 
 @admin.register(ShoppingList)
 class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe',)
+
+    def get_readonly_fields(self, request, obj=None):
+        # Cart totals follow added and deleted rows, not edited ones.
+        return ('user', 'recipe') if obj else ()
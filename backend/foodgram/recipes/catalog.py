@@ -0,0 +1,98 @@
+"""Pre-rendered responses for the near-static tag and ingredient catalogs.
+
+A catalog version is kept in the shared cache and bumped whenever a change
+of a tag or an ingredient commits. Each worker renders and gzips a catalog
+once per version and answers conditional requests with 304 Not Modified.
+"""
+import gzip
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .models import Tag
+
+VERSION_KEY = 'catalog_version'
+
+_bodies = {}
+_tag_ids = (None, {})
+_lock = threading.Lock()
+
+
+class CatalogBody:
+    def __init__(self, content):
+        self.content = content
+        self.gzipped = gzip.compress(content)
+        self.etag = f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def get_version(key=VERSION_KEY):
+    version = cache.get(key)
+    if version is None:
+        # Start from the current time, so that a version lost with the
+        # cache is never reused for different content. The version does
+        # not expire, a new one would make every worker rebuild what it
+        # has for the unchanged content.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key=VERSION_KEY):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key)
+
+
+def invalidate():
+    """Bumps the catalog version once the current transaction commits, so
+    that a catalog read before the commit is not cached as the new one."""
+    transaction.on_commit(bump_version)
+
+
+def get_body(name, build_data):
+    """Rendered catalog ``name`` for the current version; ``build_data``
+    returns the serialized data when it has to be rendered again."""
+    version = get_version()
+    body = _bodies.get((name, version))
+    if body is None:
+        body = CatalogBody(JSONRenderer().render(build_data()))
+        with _lock:
+            for key in [key for key in _bodies if key[0] == name]:
+                del _bodies[key]
+            _bodies[(name, version)] = body
+    return body
+
+
+def tag_ids():
+    """``{slug: id}`` of all tags for the current catalog version."""
+    global _tag_ids
+    version = get_version()
+    cached_version, ids = _tag_ids
+    if cached_version != version:
+        ids = dict(Tag.objects.values_list('slug', 'id'))
+        _tag_ids = (version, ids)
+    return ids
+
+
+def catalog_response(request, body):
+    if body.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(
+            body.gzipped, content_type='application/json'
+        )
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(body.content, content_type='application/json')
+    response['ETag'] = body.etag
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,209 @@
+"""In-process inverted index of recipes by ingredient for "cook with what
+I have" search.
+
+Every ingredient maps to a sorted array of ids of the recipes using it.
+Scoring a set of ingredients counts their postings with ``Counter`` (a C
+loop over the arrays) and compares the counts with the number of
+ingredients of each recipe.
+
+Changes made through the API are applied to the index of the worker
+that made them once the transaction commits, and logged in the shared
+cache under the version they bump. The log keeps the last
+``MAX_CHANGES`` changes, without a timeout, so an idle worker can catch
+up however long ago its last request was. Other workers apply the logged
+changes they missed. If one is gone from the log, e.g. after a bulk
+import, they rebuild their index in a background thread and keep serving
+the old one meanwhile.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from . import catalog
+from .models import RecipeIngredient
+
+VERSION_KEY = 'cookable_version'
+CHANGE_KEY = 'cookable_change'
+# A worker further behind rebuilds its index instead.
+MAX_CHANGES = 1000
+
+
+class CookableIndex:
+    def __init__(self, rows):
+        """``rows`` are (recipe id, ingredient id) ordered by recipe id."""
+        self.postings = {}
+        self.sizes = Counter()
+        for recipe_id, ingredient_id in rows:
+            self.postings.setdefault(ingredient_id, array('q')).append(
+                recipe_id
+            )
+            self.sizes[recipe_id] += 1
+
+    def change_recipe(self, recipe_id, old_ingredient_ids, new_ingredient_ids):
+        old_ids, new_ids = set(old_ingredient_ids), set(new_ingredient_ids)
+        for ingredient_id in old_ids - new_ids:
+            posting = self.postings.get(ingredient_id)
+            if posting is None:
+                continue
+            index = bisect_left(posting, recipe_id)
+            if index < len(posting) and posting[index] == recipe_id:
+                del posting[index]
+            if not posting:
+                del self.postings[ingredient_id]
+        for ingredient_id in new_ids - old_ids:
+            posting = self.postings.setdefault(ingredient_id, array('q'))
+            index = bisect_left(posting, recipe_id)
+            if index == len(posting) or posting[index] != recipe_id:
+                posting.insert(index, recipe_id)
+        if new_ids:
+            self.sizes[recipe_id] = len(new_ids)
+        else:
+            self.sizes.pop(recipe_id, None)
+
+    def rank(self, ingredient_ids, limit):
+        """Up to ``limit`` (recipe id, missing ingredients) pairs for the
+        recipes using any of ``ingredient_ids``: fully makeable first, then
+        by fewest missing ingredients, newest first within a group."""
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.postings.get(ingredient_id, ()))
+        sizes = self.sizes
+        return [
+            (recipe_id, missing) for missing, _, recipe_id in heapq.nsmallest(
+                limit,
+                ((sizes[recipe_id] - count, -recipe_id, recipe_id)
+                 for recipe_id, count in matched.items()),
+            )
+        ]
+
+
+_index = None
+_index_version = None
+_built_at = 0
+_rebuilding = False
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def build():
+    return CookableIndex(
+        RecipeIngredient.objects
+        .order_by('recipe_id')
+        .values_list('recipe_id', 'ingredient_id')
+        .iterator(chunk_size=10000)
+    )
+
+
+def rebuild():
+    global _index, _index_version, _built_at
+    # Changes logged after this version are applied again on top of the
+    # rows read, which the index tolerates.
+    version = catalog.get_version(VERSION_KEY)
+    index = build()
+    with _lock:
+        _index, _index_version = index, version
+        _built_at = time.monotonic()
+
+
+def rebuild_in_background():
+    """Rebuilds the index in a thread, the current one being served
+    meanwhile."""
+    global _rebuilding
+
+    def run():
+        global _rebuilding
+        try:
+            rebuild()
+        finally:
+            _rebuilding = False
+            connections.close_all()
+
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=run, name='cookable-rebuild', daemon=True).start()
+
+
+def logged_changes(index_version, version):
+    """Changes of the versions after ``index_version`` up to ``version``,
+    or None if any of them is not in the log."""
+    if not 0 < version - index_version <= MAX_CHANGES:
+        return None
+    keys = [
+        f'{CHANGE_KEY}:{number}'
+        for number in range(index_version + 1, version + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [changes[key] for key in keys]
+
+
+def get_index():
+    """Index of this worker, brought up to date with the changes logged by
+    other workers. Only the first index is built in the request; when the
+    log misses a change the index is rebuilt in the background, at most
+    once per ``COOKABLE_REFRESH_INTERVAL`` seconds."""
+    global _index_version
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                rebuild()
+        return _index
+    version = catalog.get_version(VERSION_KEY)
+    index, index_version = _index, _index_version
+    if index_version == version:
+        return index
+    changes = logged_changes(index_version, version)
+    if changes is not None:
+        with _lock:
+            if _index is index and _index_version == index_version:
+                for change in changes:
+                    index.change_recipe(*change)
+                _index_version = version
+        return _index
+    if time.monotonic() - _built_at > settings.COOKABLE_REFRESH_INTERVAL:
+        rebuild_in_background()
+    return index
+
+
+def rank_recipes(ingredient_ids, limit):
+    return get_index().rank(ingredient_ids, limit)
+
+
+def invalidate():
+    """Makes every worker rebuild its index, e.g. after a bulk import."""
+    transaction.on_commit(lambda: catalog.bump_version(VERSION_KEY))
+
+
+def recipe_changed(recipe_id, old_ingredient_ids, new_ingredient_ids):
+    """Schedules the change of recipe ingredients to be logged for other
+    workers and applied to the index once the current transaction
+    commits."""
+    change = (
+        recipe_id, list(old_ingredient_ids), list(new_ingredient_ids)
+    )
+
+    def apply():
+        global _index_version
+        version = catalog.bump_version(VERSION_KEY)
+        cache.set(f'{CHANGE_KEY}:{version}', change, timeout=None)
+        # No worker reads a change that far behind.
+        cache.delete(f'{CHANGE_KEY}:{version - MAX_CHANGES}')
+        with _lock:
+            if _index is None:
+                return
+            _index.change_recipe(*change)
+            # The index is current unless another worker changed it too.
+            if _index_version is not None and version == _index_version + 1:
+                _index_version = version
+
+    transaction.on_commit(apply)
@@ -0,0 +1,107 @@
+"""Denormalized counters of recipes, favorites, carts and follows.
+
+Every counter column is described by the model row it belongs to and the
+rows it counts. Counters are changed with F() expressions in the
+transaction that inserts or deletes the counted row, and ``reconcile``
+recomputes them from scratch when they drift. Rows deleted by one delete
+operation, e.g. the bookmarks and carts of a deleted recipe, change the
+counters once the operation ends, see ``users.deletion``.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users import deletion
+
+from .models import Bookmark, Follow, Recipe, ShoppingList, User
+
+Counter = namedtuple('Counter', 'model field source source_field')
+
+COUNTERS = (
+    Counter(User, 'recipes_count', Recipe, 'author'),
+    Counter(User, 'followers_count', Follow, 'followee'),
+    Counter(User, 'following_count', Follow, 'follower'),
+    Counter(Recipe, 'favorites_count', Bookmark, 'recipe'),
+    Counter(Recipe, 'shopping_carts_count', ShoppingList, 'recipe'),
+)
+
+
+def counters_of(source):
+    return [counter for counter in COUNTERS if counter.source is source]
+
+
+def change(counter, deltas):
+    """Adds ``deltas`` (a mapping of row id to delta) to a counter with one
+    UPDATE per distinct delta. Counters never go below zero."""
+    ids_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            ids_by_delta[delta].append(pk)
+    for delta, ids in ids_by_delta.items():
+        rows = counter.model.objects.filter(pk__in=ids)
+        if delta < 0:
+            rows = rows.filter(**{f'{counter.field}__gte': -delta})
+        rows.update(**{counter.field: F(counter.field) + delta})
+
+
+class CounterDeltas:
+    """Deltas of all counters, applied with one UPDATE per counter and
+    distinct delta."""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: defaultdict(int))
+
+    def add(self, source, objs, delta):
+        for counter in counters_of(source):
+            for obj in objs:
+                pk = getattr(obj, f'{counter.source_field}_id')
+                self.deltas[counter][pk] += delta
+
+    def apply(self):
+        for counter, deltas in self.deltas.items():
+            change(counter, deltas)
+
+
+def count_inserted(source, objs):
+    """Updates the counters after ``objs`` were inserted in bulk."""
+    deltas = CounterDeltas()
+    deltas.add(source, objs, 1)
+    deltas.apply()
+
+
+def count_deleted(source, obj):
+    """Updates the counters after ``obj`` was deleted, or once the delete
+    operation deleting it ends."""
+    deltas = deletion.pending('counters', CounterDeltas)
+    if deltas is not None:
+        deltas.add(source, [obj], -1)
+    else:
+        deltas = CounterDeltas()
+        deltas.add(source, [obj], -1)
+        deltas.apply()
+
+
+def actual_count(counter):
+    return Coalesce(Subquery(
+        counter.source.objects
+        .filter(**{counter.source_field: OuterRef('pk')})
+        .order_by()
+        .values(counter.source_field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def reconcile():
+    """Recomputes every counter that drifted from the rows it counts and
+    returns the number of fixed values per counter."""
+    fixed = {}
+    for counter in COUNTERS:
+        drifted = counter.model.objects.annotate(
+            actual=actual_count(counter)
+        ).exclude(**{counter.field: F('actual')}).values('pk')
+        fixed[counter] = counter.model.objects.filter(
+            pk__in=drifted
+        ).update(**{counter.field: actual_count(counter)})
+    return fixed
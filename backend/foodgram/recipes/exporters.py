@@ -0,0 +1,89 @@
+import csv
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ShoppingCartIngredient
+from .pdf import stream_pdf
+
+TITLE = 'Список покупок'
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+
+
+def shopping_cart_ingredients(user):
+    """Ingredient totals of the user's cart, read through a server-side
+    cursor on backends that support one."""
+    return (ShoppingCartIngredient.objects
+            .filter(user=user)
+            .values_list('ingredient__name', 'ingredient__measurement_unit',
+                         'amount')
+            .order_by('ingredient__name')
+            .iterator(chunk_size=500))
+
+
+def shopping_cart_cache_key(user_id, version, export_format):
+    return f'shopping_cart:{user_id}:{version}:{export_format}'
+
+
+def cache_export(cache_key, chunks):
+    """Passes ``chunks`` through and caches the whole export once it is
+    sent, unless it grows over ``SHOPPING_CART_CACHE_MAX_SIZE``."""
+    parts, size = [], 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if parts is not None:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > settings.SHOPPING_CART_CACHE_MAX_SIZE:
+                parts = None
+        yield chunk
+    if parts is not None:
+        cache.set(
+            cache_key, b''.join(parts), settings.SHOPPING_CART_CACHE_TIMEOUT
+        )
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_txt(rows):
+    for name, measurement_unit, amount in rows:
+        yield f'{name} ({measurement_unit}) — {amount}\n'
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(CSV_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_pdf(rows):
+    lines = (
+        f'{name} ({measurement_unit}) — {amount}'
+        for name, measurement_unit, amount in rows
+    )
+    return stream_pdf(
+        _with_title(lines), settings.SHOPPING_CART_PDF_FONT
+    )
+
+
+def _with_title(lines):
+    yield TITLE
+    yield ''
+    yield from lines
+
+
+def pdf_export_available():
+    return os.path.exists(settings.SHOPPING_CART_PDF_FONT)
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'pdf': export_pdf,
+}
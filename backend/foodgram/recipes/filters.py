@@ -1,37 +1,105 @@
 import django_filters as filters
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
 
-from .models import Recipe, Ingredient, User
+from . import catalog, fulltext
+from .models import Bookmark, Ingredient, Recipe, ShoppingList, User
+
+RecipeTag = Recipe.tags.through
+FLAG_CHOICES = (('0', 'Нет'), ('1', 'Да'))
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
+    """Recipe list filters.
+
+    ``tags`` keeps recipes with any of the given tags, or with all of them
+    if ``tags_mode=all``. Tags are checked by EXISTS over the through
+    table, so the recipes are not joined with their tags and duplicated.
+
+    ``is_favorited`` and ``is_in_shopping_cart`` look up the row of the
+    requesting user for each recipe by the unique (user, recipe) index, so
+    their cost does not depend on how many bookmarks other users have.
+    """
+    # Choices are set by __init__.
+    tags = filters.MultipleChoiceFilter(choices=(), method='filter_tags')
+    tags_mode = filters.ChoiceFilter(
+        choices=(('any', 'Любой из тегов'), ('all', 'Все теги')),
+        method='filter_tags_mode',
     )
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all()
     )
-    is_favorited = filters.CharFilter(
-        method='filter_is_favorited'
+    is_favorited = filters.ChoiceFilter(
+        choices=FLAG_CHOICES, method='filter_is_favorited'
     )
-    is_in_shopping_cart = filters.CharFilter(
-        method='filter_is_in_shopping_cart'
+    is_in_shopping_cart = filters.ChoiceFilter(
+        choices=FLAG_CHOICES, method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.OrderingFilter(
+        fields=('pub_date', 'favorites_count', 'cooking_time',)
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # A function, unlike a bound method, is not deep-copied with the
+        # form fields.
+        def tag_choices():
+            return [(slug, slug) for slug in self.tag_ids]
+
+        self.filters['tags'].extra['choices'] = tag_choices
+
+    @cached_property
+    def tag_ids(self):
+        # Validation and filtering use one map, even if the catalog
+        # version changes in between.
+        return catalog.tag_ids()
+
+    def filter_tags(self, queryset, name, value):
+        ids = {
+            self.tag_ids[slug] for slug in value if slug in self.tag_ids
+        }
+        if self.form.cleaned_data.get('tags_mode') == 'all':
+            for tag_id in ids:
+                queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                    recipe_id=OuterRef('pk'), tag_id=tag_id
+                )))
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            recipe_id=OuterRef('pk'), tag_id__in=ids
+        )))
+
+    def filter_tags_mode(self, queryset, name, value):
+        # Applied by filter_tags.
+        return queryset
+
+    def filter_user_recipes(self, queryset, model, value):
+        """Recipes that the requesting user has (``1``) or has not (``0``)
+        added to ``model``. An anonymous user has added none."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value == '1' else queryset
+        added = Exists(model.objects.filter(
+            user=user, recipe_id=OuterRef('pk')
+        ))
+        return queryset.filter(added if value == '1' else ~added)
 
     def filter_is_favorited(self, queryset, name, value):
-        if value == '1':
-            return queryset.filter(bookmarks__user=self.request.user)
-        if value == '0':
-            return queryset.filter(bookmarks__user__isnull=True)
+        return self.filter_user_recipes(queryset, Bookmark, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value == '1':
-            return queryset.filter(shopping_list__user=self.request.user)
-        if value == '0':
-            return queryset.filter(shopping_list__user__isnull=True)
+        return self.filter_user_recipes(queryset, ShoppingList, value)
+
+    def filter_search(self, queryset, name, value):
+        return fulltext.search(queryset, value)
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
+        fields = (
+            'tags', 'tags_mode', 'author', 'is_favorited',
+            'is_in_shopping_cart', 'search',
+        )
 
 
 class IngredientFilter(filters.FilterSet):
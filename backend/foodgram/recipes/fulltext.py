@@ -0,0 +1,115 @@
+"""Ranked full-text search over recipe names and descriptions.
+
+On PostgreSQL a ``search_vector`` column with Russian stemming is kept up
+to date by a trigger and indexed with GIN (see migration 0011). On SQLite
+an external content FTS5 table kept in sync by triggers serves the same
+interface; it has no Russian stemmer, so words are matched by prefix.
+Other backends fall back to substring matching.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe
+
+RECIPE_TABLE = Recipe._meta.db_table
+FTS_TABLE = f'{RECIPE_TABLE}_fts'
+
+SQLITE_OBJECTS = (
+    (FTS_TABLE, f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            name, text, content='{RECIPE_TABLE}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """),
+    (f'{FTS_TABLE}_insert', f"""
+        CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {RECIPE_TABLE}
+        BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END
+    """),
+    (f'{FTS_TABLE}_delete', f"""
+        CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {RECIPE_TABLE}
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+        END
+    """),
+    (f'{FTS_TABLE}_update', f"""
+        CREATE TRIGGER {FTS_TABLE}_update
+        AFTER UPDATE OF name, text ON {RECIPE_TABLE}
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+            VALUES ('delete', old.id, old.name, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, name, text)
+            VALUES (new.id, new.name, new.text);
+        END
+    """),
+)
+
+
+def install_sqlite_index(using='default'):
+    """Creates the FTS5 table and its triggers if they are missing and
+    reindexes all recipes in that case.
+
+    Runs after every ``migrate``, because SQLite drops the triggers when a
+    migration rebuilds the recipe table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or (
+            RECIPE_TABLE not in connection.introspection.table_names()):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', "
+            "'trigger') AND name LIKE %s", (f'{FTS_TABLE}%',)
+        )
+        existing = {name for name, in cursor.fetchall()}
+        missing = [sql for name, sql in SQLITE_OBJECTS if name not in existing]
+        for sql in missing:
+            cursor.execute(sql)
+        if missing:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def fts5_query(query):
+    """Every word of the query as a quoted prefix term, all required."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search(queryset, query):
+    """Recipes of ``queryset`` matching ``query``, most relevant first,
+    with the relevance annotated as ``search_rank``."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('russian', %s)"
+        queryset = queryset.filter(RawSQL(
+            f'{RECIPE_TABLE}.search_vector @@ {tsquery}', (query,),
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({RECIPE_TABLE}.search_vector, {tsquery})', (query,),
+            output_field=FloatField(),
+        ))
+    elif vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        queryset = queryset.filter(RawSQL(
+            f'{RECIPE_TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)', (match,),
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {RECIPE_TABLE}.id)',
+            (match,), output_field=FloatField(),
+        ))
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,208 @@
+"""Content-addressed recipe photos and their resized renditions.
+
+An uploaded photo is named after the SHA-256 of its bytes, so identical
+uploads are stored once. It is then normalized once into a few sizes in
+WebP and JPEG, without EXIF and colour profile metadata, stored next to
+each other under ``recipes/renditions/<hash>/``. Since a file name never
+changes its content, nginx may cache renditions forever.
+
+Uploads are bounded before they are decoded: the size is known from the
+length of the base64 string or of the uploaded file, and the pixel
+dimensions are read from the image header. Base64 is decoded chunk by
+chunk into a temporary file, so a photo is never held in memory twice.
+"""
+import io
+import os
+import re
+from binascii import Error as BinasciiError, a2b_base64
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from .models import Recipe
+from .storage import hash_file
+
+RENDITIONS_DIR = 'recipes/renditions'
+
+RENDITIONS = (
+    ('card', 480),
+    ('detail', 960),
+    ('retina', 1920),
+)
+
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+BASE64_CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'\s+')
+
+
+class RecipeImageField(Base64ImageField):
+    """Recipe photo sent either as a base64 string or as an uploaded file,
+    named after the hash of its content."""
+    ALLOWED_TYPES = tuple(IMAGE_EXTENSIONS.values())
+    INVALID_FILE_MESSAGE = 'Загрузите корректное изображение'
+    INVALID_TYPE_MESSAGE = 'Формат изображения не поддерживается'
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if isinstance(data, str):
+            data = self.decode(data)
+        elif not isinstance(data, UploadedFile):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = self.check_image(data)
+        data.name = f'{hash_file(data)}.{extension}'
+        return serializers.ImageField.to_internal_value(self, data)
+
+    def decode(self, base64_data):
+        """Decodes a base64 string into a temporary file, one chunk at a
+        time, refusing it upfront when the result would be too large."""
+        start = base64_data.find(';base64,', 0, 100)
+        start = 0 if start == -1 else start + len(';base64,')
+        if (len(base64_data) - start) // 4 * 3 > (
+                settings.RECIPE_IMAGE_MAX_SIZE):
+            raise serializers.ValidationError(too_large_message())
+
+        decoded_file = TemporaryUploadedFile(
+            'image', 'application/octet-stream', 0, None
+        )
+        rest = ''
+        try:
+            for offset in range(start, len(base64_data), BASE64_CHUNK_SIZE):
+                chunk = rest + WHITESPACE.sub(
+                    '', base64_data[offset:offset + BASE64_CHUNK_SIZE]
+                )
+                end = len(chunk) - len(chunk) % 4
+                decoded_file.write(a2b_base64(chunk[:end]))
+                rest = chunk[end:]
+        except (BinasciiError, ValueError):
+            decoded_file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        if rest:
+            decoded_file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        decoded_file.size = decoded_file.tell()
+        decoded_file.seek(0)
+        return decoded_file
+
+    def check_image(self, image_file):
+        """Checks the size and the pixel dimensions of an image reading only
+        its header, returns the file extension for its format."""
+        if image_file.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(too_large_message())
+        try:
+            image_file.seek(0)
+            with Image.open(image_file) as image:
+                width, height = image.size
+                image_format = image.format
+        except (OSError, Image.DecompressionBombError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        finally:
+            image_file.seek(0)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise serializers.ValidationError(
+                'Разрешение фото больше '
+                f'{settings.RECIPE_IMAGE_MAX_PIXELS // 10 ** 6} Мп'
+            )
+        if image_format not in IMAGE_EXTENSIONS:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return IMAGE_EXTENSIONS[image_format]
+
+
+def too_large_message():
+    return (
+        'Размер фото больше '
+        f'{settings.RECIPE_IMAGE_MAX_SIZE // 1024 ** 2} МБ'
+    )
+
+
+def file_hash(image):
+    """Content hash of a photo, taken from its name when the photo is
+    stored content-addressed."""
+    stem = os.path.splitext(os.path.basename(image.name))[0]
+    if len(stem) == 64 and all(char in '0123456789abcdef' for char in stem):
+        return stem
+    with image.open('rb') as image_file:
+        return hash_file(image_file)
+
+
+def rendition_name(image_hash, size, extension):
+    return f'{RENDITIONS_DIR}/{image_hash}/{size}.{extension}'
+
+
+def build_renditions(image, image_hash):
+    """Saves every rendition of ``image`` that is not stored yet."""
+    names = {
+        (size, extension): rendition_name(image_hash, size, extension)
+        for size, _ in RENDITIONS for extension, _, _ in FORMATS
+    }
+    if all(default_storage.exists(name) for name in names.values()):
+        return
+    with image.open('rb') as image_file:
+        original = Image.open(image_file)
+        largest = max(width for _, width in RENDITIONS)
+        original.draft('RGB', (largest, largest))
+        original = ImageOps.exif_transpose(original)
+        if original.mode in ('RGBA', 'LA', 'P'):
+            original = original.convert('RGBA')
+            background = Image.new('RGB', original.size, 'white')
+            background.paste(original, mask=original.getchannel('A'))
+            original = background
+        else:
+            original = original.convert('RGB')
+
+    for size, width in RENDITIONS:
+        resized = original.copy()
+        resized.thumbnail((width, width), Image.LANCZOS)
+        for extension, image_format, options in FORMATS:
+            name = names[(size, extension)]
+            if default_storage.exists(name):
+                continue
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def process_recipe_image(recipe):
+    """Builds the renditions of the recipe photo and records its hash."""
+    if not recipe.image:
+        image_hash = ''
+    else:
+        image_hash = file_hash(recipe.image)
+        build_renditions(recipe.image, image_hash)
+    if image_hash != recipe.image_hash:
+        recipe.image_hash = image_hash
+        Recipe.objects.filter(id=recipe.id).update(image_hash=image_hash)
+
+
+def rendition_urls(recipe, request=None):
+    """``{size: {format: url}}`` for the renditions of the recipe photo."""
+    if not recipe.image_hash:
+        return None
+    urls = {}
+    for size, _ in RENDITIONS:
+        urls[size] = {}
+        for extension, _, _ in FORMATS:
+            url = default_storage.url(
+                rendition_name(recipe.image_hash, size, extension)
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[size][extension] = url
+    return urls
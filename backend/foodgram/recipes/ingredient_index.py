@@ -0,0 +1,182 @@
+"""In-process search index for ingredient autocomplete.
+
+The whole ingredient catalog is small (a few thousand rows), so it is kept
+in memory of every worker, rebuilt when the catalog version changes, and
+searched without touching the database.
+Matches are ranked: the name starts with the query, then a word of the
+name starts with it, then the name contains it, then a word starts with
+the query up to one or two typos.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+from django.db import DatabaseError
+
+from . import catalog
+from .models import Ingredient
+from .serializers import IngredientSerializer
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def bigrams(word):
+    return {word[i:i + 2] for i in range(len(word) - 1)}
+
+
+def allowed_typos(query):
+    if len(query) >= 8:
+        return 2
+    if len(query) >= 4:
+        return 1
+    return 0
+
+
+def prefix_distance(query, word, limit):
+    """Edit distance between ``query`` and the closest prefix of ``word``,
+    or ``limit + 1`` once it is certain to exceed ``limit``."""
+    previous = list(range(len(word) + 1))
+    for i, query_char in enumerate(query, start=1):
+        current = [i]
+        for j, word_char in enumerate(word, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (query_char != word_char),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous)
+
+
+class IngredientIndex:
+    def __init__(self, ingredients):
+        self.items = IngredientSerializer(ingredients, many=True).data
+        self.names = [normalize(item['name']) for item in self.items]
+        self.spaced_names = [f' {name}' for name in self.names]
+        self.sorted_names = sorted(
+            (name, position) for position, name in enumerate(self.names)
+        )
+        self.sorted_keys = [name for name, _ in self.sorted_names]
+
+        self.words = []
+        self.bigram_postings = {}
+        for position, name in enumerate(self.names):
+            for order, word in enumerate(name.split(' ')):
+                word_id = len(self.words)
+                self.words.append((word, position, order))
+                for bigram in bigrams(word):
+                    self.bigram_postings.setdefault(bigram, []).append(
+                        word_id
+                    )
+
+    def search(self, query, limit):
+        query = normalize(query)
+        if not query:
+            return self.items[:limit]
+
+        found = []
+        seen = set()
+
+        def add(positions):
+            for position in positions:
+                if len(found) == limit:
+                    return
+                if position not in seen:
+                    seen.add(position)
+                    found.append(self.items[position])
+
+        add(self.prefix_matches(query))
+        if len(found) < limit:
+            spaced_query = f' {query}'
+            add(sorted(
+                (position for position, name in enumerate(self.spaced_names)
+                 if spaced_query in name),
+                key=self.names.__getitem__,
+            ))
+        if len(found) < limit:
+            add(sorted(
+                (position for position, name in enumerate(self.names)
+                 if query in name),
+                key=self.names.__getitem__,
+            ))
+        if len(found) < limit:
+            add(self.typo_matches(query))
+        return found
+
+    def prefix_matches(self, query):
+        start = bisect_left(self.sorted_keys, query)
+        for name, position in self.sorted_names[start:]:
+            if not name.startswith(query):
+                return
+            yield position
+
+    def typo_matches(self, query):
+        """Words within the allowed number of typos, nearest first.
+
+        Candidates are words sharing enough bigrams with the query: every
+        edit destroys at most two of its bigrams.
+        """
+        limit = allowed_typos(query)
+        if not limit:
+            return []
+        query_bigrams = bigrams(query)
+        hits = Counter()
+        for bigram in query_bigrams:
+            hits.update(self.bigram_postings.get(bigram, ()))
+        required = len(query_bigrams) - 2 * limit
+
+        matches = {}
+        for word_id, count in hits.items():
+            if count < required:
+                continue
+            word, position, order = self.words[word_id]
+            if len(word) < len(query) - limit:
+                continue
+            distance = prefix_distance(
+                query, word[:len(query) + limit], limit
+            )
+            if distance <= limit:
+                rank = (distance, order > 0, self.names[position])
+                matches[position] = min(rank, matches.get(position, rank))
+        return sorted(matches, key=matches.__getitem__)
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """Index for the current catalog version, so that ingredients changed
+    in another worker are picked up too."""
+    global _index, _index_version
+    version = catalog.get_version()
+    index = _index
+    if index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = IngredientIndex(Ingredient.objects.order_by('name'))
+                _index_version = version
+            index = _index
+    return index
+
+
+def warm_up():
+    """Builds the index at worker startup if the database is ready."""
+    try:
+        get_index()
+    except DatabaseError:
+        invalidate()
+
+
+def invalidate():
+    global _index
+    _index = None
+
+
+def search(query, limit):
+    return get_index().search(query, limit)
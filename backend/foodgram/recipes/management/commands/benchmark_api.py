@@ -0,0 +1,406 @@
+import base64
+import io
+import json
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import setup_test_environment, teardown_test_environment
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.mixins import QueryBudgetExceeded
+from recipes.models import Bookmark, Follow, Recipe, ShoppingList, Tag, User
+from recipes.nplusone import NPlusOneDetected
+from recipes.pagination import CustomPagination
+from recipes.seeding import seed_database
+from recipes.urls import router
+from recipes.views import RecipeViewSet
+
+AUTH_URL_NAMES = ('login', 'logout')
+DEFAULT_BASELINE = f'{settings.BASE_DIR}/benchmarks/api_baseline.json'
+
+
+class SQLCollector:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#E26C2D').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def png_base64():
+    encoded = base64.b64encode(png_bytes()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def build_scenarios(viewer):
+    """(label, url name, method, path, data, authenticated) for every route.
+
+    ``data`` is sent as JSON, or as is as multipart form data if it is
+    already encoded into bytes.
+    """
+    own_recipe = Recipe.objects.filter(author=viewer).first()
+    bookmarked = Bookmark.objects.filter(user=viewer).first().recipe_id
+    in_cart = ShoppingList.objects.filter(user=viewer).first().recipe_id
+    other_recipe = (Recipe.objects
+                    .exclude(bookmarks__user=viewer)
+                    .exclude(shopping_list__user=viewer)
+                    .exclude(author=viewer)
+                    .first().id)
+    followee = Follow.objects.filter(follower=viewer).first().followee_id
+    stranger = (User.objects
+                .exclude(id=viewer.id)
+                .exclude(followee__follower=viewer)
+                .first().id)
+    tags = list(Tag.objects.values_list('id', 'slug'))
+    ingredient_ids = list(
+        own_recipe.recipe_ingredients.values_list('ingredient_id', flat=True)
+    )
+    recipe_data = {
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 10}
+            for ingredient_id in ingredient_ids
+        ],
+        'tags': [tag_id for tag_id, _ in tags],
+        'image': png_base64(),
+        'name': 'Бенчмарк',
+        'text': 'Рецепт для бенчмарка',
+        'cooking_time': 15,
+    }
+    user_data = {
+        'email': 'new@example.com', 'username': 'new',
+        'first_name': 'Новый', 'last_name': 'Пользователь',
+        'password': 'Sup3r-secret',
+    }
+    slugs = '&'.join(f'tags={slug}' for _, slug in tags[:2])
+    deep_page = Recipe.objects.count() // 12
+    paginator = CustomPagination()
+    paginator.ordering = RecipeViewSet.cursor_orderings['list']
+    deep_cursor = paginator.encode_cursor(
+        Recipe.objects.order_by(*paginator.ordering)[deep_page * 6]
+    )
+    return [
+        ('api-root', 'api-root', 'get', '/api/', None, False),
+        ('metrics', 'metrics', 'get', '/api/metrics', None, False),
+        ('ingredients-list', 'ingredients-list', 'get',
+         '/api/ingredients/', None, False),
+        ('ingredients-list[search]', 'ingredients-list', 'get',
+         '/api/ingredients/?name=мо', None, False),
+        ('ingredients-detail', 'ingredients-detail', 'get',
+         f'/api/ingredients/{ingredient_ids[0]}/', None, False),
+        ('tags-list', 'tags-list', 'get', '/api/tags/', None, False),
+        ('tags-detail', 'tags-detail', 'get',
+         f'/api/tags/{tags[0][0]}/', None, False),
+        ('recipes-list[anonymous]', 'recipes-list', 'get',
+         '/api/recipes/', None, False),
+        ('recipes-list', 'recipes-list', 'get',
+         '/api/recipes/?limit=6', None, True),
+        ('recipes-list[deep page]', 'recipes-list', 'get',
+         f'/api/recipes/?limit=6&page={deep_page}', None, True),
+        ('recipes-list[deep cursor]', 'recipes-list', 'get',
+         f'/api/recipes/?limit=6&cursor={deep_cursor}', None, True),
+        ('recipes-timeline', 'recipes-timeline', 'get',
+         '/api/recipes/timeline/?limit=6', None, True),
+        ('recipes-timeline[cursor]', 'recipes-timeline', 'get',
+         '/api/recipes/timeline/?limit=6&cursor=', None, True),
+        ('recipes-list[search]', 'recipes-list', 'get',
+         '/api/recipes/?limit=6&search=рецепт+42', None, True),
+        ('recipes-cookable', 'recipes-cookable', 'get',
+         '/api/recipes/cookable/?limit=6&ingredients=' + ','.join(
+             map(str, ingredient_ids)), None, True),
+        ('recipes-list[tags]', 'recipes-list', 'get',
+         f'/api/recipes/?limit=6&{slugs}', None, True),
+        ('recipes-list[tags_mode=all]', 'recipes-list', 'get',
+         f'/api/recipes/?limit=6&{slugs}&tags_mode=all', None, True),
+        ('recipes-list[author]', 'recipes-list', 'get',
+         f'/api/recipes/?limit=6&author={viewer.id}', None, True),
+        ('recipes-list[is_favorited]', 'recipes-list', 'get',
+         '/api/recipes/?limit=6&is_favorited=1', None, True),
+        ('recipes-list[is_in_shopping_cart]', 'recipes-list', 'get',
+         '/api/recipes/?limit=6&is_in_shopping_cart=1', None, True),
+        ('recipes-list[is_favorited=0]', 'recipes-list', 'get',
+         '/api/recipes/?limit=6&is_favorited=0', None, True),
+        ('recipes-list[is_in_shopping_cart=0]', 'recipes-list', 'get',
+         '/api/recipes/?limit=6&is_in_shopping_cart=0', None, True),
+        ('recipes-list[is_favorited, anonymous]', 'recipes-list', 'get',
+         '/api/recipes/?limit=6&is_favorited=1', None, False),
+        ('recipes-list[create]', 'recipes-list', 'post',
+         '/api/recipes/', recipe_data, True),
+        ('recipes-detail[anonymous]', 'recipes-detail', 'get',
+         f'/api/recipes/{own_recipe.id}/', None, False),
+        ('recipes-detail', 'recipes-detail', 'get',
+         f'/api/recipes/{own_recipe.id}/', None, True),
+        ('recipes-detail[update]', 'recipes-detail', 'patch',
+         f'/api/recipes/{own_recipe.id}/', recipe_data, True),
+        ('recipes-detail[delete]', 'recipes-detail', 'delete',
+         f'/api/recipes/{own_recipe.id}/', None, True),
+        ('recipes-image', 'recipes-image', 'put',
+         f'/api/recipes/{own_recipe.id}/image/', encode_multipart(
+             BOUNDARY, {'image': SimpleUploadedFile(
+                 'photo.png', png_bytes(), 'image/png'
+             )}
+         ), True),
+        ('recipes-favorite', 'recipes-favorite', 'post',
+         f'/api/recipes/{other_recipe}/favorite/', None, True),
+        ('recipes-favorite[delete]', 'recipes-favorite', 'delete',
+         f'/api/recipes/{bookmarked}/favorite/', None, True),
+        ('recipes-shopping-cart', 'recipes-shopping-cart', 'post',
+         f'/api/recipes/{other_recipe}/shopping_cart/', None, True),
+        ('recipes-shopping-cart[delete]', 'recipes-shopping-cart', 'delete',
+         f'/api/recipes/{in_cart}/shopping_cart/', None, True),
+        ('recipes-download-shopping-cart', 'recipes-download-shopping-cart',
+         'get', '/api/recipes/download_shopping_cart/', None, True),
+        ('recipes-download-shopping-cart[csv]',
+         'recipes-download-shopping-cart', 'get',
+         '/api/recipes/download_shopping_cart/?format=csv', None, True),
+        ('recipes-download-shopping-cart[pdf]',
+         'recipes-download-shopping-cart', 'get',
+         '/api/recipes/download_shopping_cart/?format=pdf', None, True),
+        ('users-list', 'users-list', 'get', '/api/users/', None, True),
+        ('users-list[create]', 'users-list', 'post',
+         '/api/users/', user_data, False),
+        ('users-detail', 'users-detail', 'get',
+         f'/api/users/{followee}/', None, True),
+        ('users-me', 'users-me', 'get', '/api/users/me/', None, True),
+        ('users-subscriptions', 'users-subscriptions', 'get',
+         '/api/users/subscriptions/?recipes_limit=3', None, True),
+        ('users-subscribe', 'users-subscribe', 'post',
+         f'/api/users/{stranger}/subscribe/', None, True),
+        ('users-subscribe[delete]', 'users-subscribe', 'delete',
+         f'/api/users/{followee}/subscribe/', None, True),
+        ('users-set-password', 'users-set-password', 'post',
+         '/api/users/set_password/',
+         {'current_password': 'benchmark', 'new_password': 'Sup3r-secret'},
+         True),
+        ('users-set-username', 'users-set-username', 'post',
+         '/api/users/set_email/',
+         {'current_password': 'benchmark', 'new_email': 'me@example.com'},
+         True),
+        ('users-activation', 'users-activation', 'post',
+         '/api/users/activation/', {'uid': 'x', 'token': 'x'}, False),
+        ('users-resend-activation', 'users-resend-activation', 'post',
+         '/api/users/resend_activation/', {'email': viewer.email}, False),
+        ('users-reset-password', 'users-reset-password', 'post',
+         '/api/users/reset_password/', {'email': viewer.email}, False),
+        ('users-reset-password-confirm', 'users-reset-password-confirm',
+         'post', '/api/users/reset_password_confirm/',
+         {'uid': 'x', 'token': 'x', 'new_password': 'Sup3r-secret'}, False),
+        ('users-reset-username', 'users-reset-username', 'post',
+         '/api/users/reset_email/', {'email': viewer.email}, False),
+        ('users-reset-username-confirm', 'users-reset-username-confirm',
+         'post', '/api/users/reset_email_confirm/',
+         {'uid': 'x', 'token': 'x', 'new_email': 'me@example.com'}, False),
+        ('login', 'login', 'post', '/api/auth/token/login/',
+         {'email': viewer.email, 'password': 'benchmark'}, False),
+        ('logout', 'logout', 'post', '/api/auth/token/logout/', None, True),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Измеряет количество SQL-запросов и время ответа всех '
+            'эндпоинтов API на тестовой базе и сравнивает с эталоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000,
+                            help='Количество рецептов в тестовой базе')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument(
+            '--time-tolerance', type=float,
+            help=('Допустимое относительное замедление, например 0.5; '
+                  'без параметра сравнивается только число запросов')
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(MEDIA_ROOT=media_root,
+                                       QUERY_BUDGET_ENFORCE=True,
+                                       NPLUSONE_MODE='raise'):
+                    report = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        content = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(content + '\n')
+        self.print_table(report)
+
+        # A server error is a broken scenario, never an expected result.
+        errors = [
+            label for label, result in report['endpoints'].items()
+            if result['status'] >= 500
+        ]
+        if errors:
+            raise CommandError(f'Ошибки сервера: {", ".join(errors)}')
+
+        if options['update_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as output:
+                output.write(content + '\n')
+            self.stdout.write(f'Эталон сохранён в {options["baseline"]}')
+            return
+        self.compare(report, options)
+
+    def run_benchmark(self, options):
+        viewer = seed_database(options['size'], seed=options['seed'])
+        token = Token.objects.create(user=viewer)
+        clients = {
+            False: Client(raise_request_exception=False),
+            True: Client(
+                raise_request_exception=False,
+                HTTP_AUTHORIZATION=f'Token {token.key}',
+            ),
+        }
+        scenarios = build_scenarios(viewer)
+
+        covered = {url_name for _, url_name, *_ in scenarios}
+        expected = {url.name for url in router.urls} | set(AUTH_URL_NAMES)
+        if expected - covered:
+            raise CommandError(
+                f'Нет сценариев для маршрутов: {sorted(expected - covered)}'
+            )
+
+        endpoints = {}
+        for label, url_name, method, path, data, authenticated in scenarios:
+            client = clients[authenticated]
+            runs = [
+                self.measure(client, method, path, data)
+                for _ in range(options['repeat'])
+            ]
+            endpoints[label] = {
+                'url_name': url_name,
+                'method': method.upper(),
+                'path': path,
+                'status': runs[-1]['status'],
+                'over_budget': any(run['over_budget'] for run in runs),
+                'n_plus_one': any(run['n_plus_one'] for run in runs),
+                'queries': max(run['queries'] for run in runs),
+                'sql_ms': round(
+                    statistics.median(run['sql_ms'] for run in runs), 3
+                ),
+                'wall_ms': round(
+                    statistics.median(run['wall_ms'] for run in runs), 3
+                ),
+            }
+        return {
+            'meta': {
+                'size': options['size'],
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'vendor': connection.vendor,
+            },
+            'endpoints': endpoints,
+        }
+
+    def measure(self, client, method, path, data):
+        collector = SQLCollector()
+        with transaction.atomic():
+            with connection.execute_wrapper(collector):
+                start = time.perf_counter()
+                response = getattr(client, method)(
+                    path, data=data, content_type=(
+                        MULTIPART_CONTENT if isinstance(data, bytes)
+                        else 'application/json'
+                    )
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                wall = time.perf_counter() - start
+            transaction.set_rollback(True)
+        return {
+            'status': response.status_code,
+            'over_budget': bool(response.exc_info) and isinstance(
+                response.exc_info[1], QueryBudgetExceeded
+            ),
+            'n_plus_one': bool(response.exc_info) and isinstance(
+                response.exc_info[1], NPlusOneDetected
+            ),
+            'queries': collector.count,
+            'sql_ms': collector.time * 1000,
+            'wall_ms': wall * 1000,
+        }
+
+    def print_table(self, report):
+        for label, result in report['endpoints'].items():
+            status = result['status']
+            if result['over_budget']:
+                status = 'OVER'
+            elif result.get('n_plus_one'):
+                status = 'N+1'
+            self.stdout.write(
+                f'{label:<40} {status:>4} '
+                f'{result["queries"]:>4} q '
+                f'{result["sql_ms"]:>9.2f} ms sql '
+                f'{result["wall_ms"]:>9.2f} ms'
+            )
+
+    def compare(self, report, options):
+        try:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            self.stdout.write(f'Эталон {options["baseline"]} не найден')
+            return
+
+        tolerance = options['time_tolerance']
+        regressions = []
+        for label, expected in baseline['endpoints'].items():
+            actual = report['endpoints'].get(label)
+            if actual is None:
+                regressions.append(f'{label}: сценарий пропал')
+                continue
+            if actual['over_budget'] and not expected['over_budget']:
+                regressions.append(f'{label}: превышен бюджет запросов')
+            if actual['n_plus_one'] and not expected.get('n_plus_one'):
+                regressions.append(f'{label}: повторяющиеся запросы (N+1)')
+            if actual['status'] != expected['status']:
+                regressions.append(
+                    f'{label}: статус {actual["status"]}, '
+                    f'ожидался {expected["status"]}'
+                )
+            if actual['queries'] > expected['queries']:
+                regressions.append(
+                    f'{label}: {actual["queries"]} запросов, '
+                    f'в эталоне {expected["queries"]}'
+                )
+            if (tolerance is not None
+                    and actual['wall_ms']
+                    > expected['wall_ms'] * (1 + tolerance)):
+                regressions.append(
+                    f'{label}: {actual["wall_ms"]} мс, '
+                    f'в эталоне {expected["wall_ms"]} мс'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write('Регрессий относительно эталона нет')
@@ -0,0 +1,130 @@
+import random
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands.benchmark_api import SQLCollector
+from recipes.models import Bookmark, Recipe, ShoppingList, User
+from recipes.seeding import seed_database
+
+PATHS = (
+    ('is_favorited=1', '/api/recipes/?limit=6&is_favorited=1'),
+    ('is_favorited=0', '/api/recipes/?limit=6&is_favorited=0'),
+    ('is_in_shopping_cart=1', '/api/recipes/?limit=6&is_in_shopping_cart=1'),
+    ('is_in_shopping_cart=0', '/api/recipes/?limit=6&is_in_shopping_cart=0'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что фильтры is_favorited и is_in_shopping_cart '
+            'не замедляются с ростом избранного и списков покупок других '
+            'пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000,
+                            help='Количество рецептов в тестовой базе')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--growth', type=int, nargs='+', default=[5, 20],
+            help=('Во сколько раз больше рецептов добавить в избранное и '
+                  'списки покупок других пользователей на каждом шаге')
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=2.0,
+            help='Допустимое относительное замедление SQL, например 1.0'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            results = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        regressions = []
+        for label, timings in results.items():
+            first, *_, last = timings
+            if last > first * (1 + options['tolerance']):
+                regressions.append(
+                    f'{label}: {first:.2f} мс -> {last:.2f} мс'
+                )
+        if regressions:
+            raise CommandError(
+                'Фильтры зависят от данных других пользователей:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write('Время фильтров не зависит от данных других '
+                          'пользователей')
+
+    def run_benchmark(self, options):
+        viewer = seed_database(options['size'], seed=options['seed'])
+        token = Token.objects.create(user=viewer)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        rng = random.Random(options['seed'])
+        user_ids = list(
+            User.objects.exclude(id=viewer.id).values_list('id', flat=True)
+        )
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+        rows = []
+        results = {label: [] for label, _ in PATHS}
+        for step in [0] + options['growth']:
+            if step:
+                for model in (Bookmark, ShoppingList):
+                    self.grow(model, viewer, options['size'] * step,
+                              user_ids, recipe_ids, rng)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            rows.append(Bookmark.objects.count())
+            for label, path in PATHS:
+                results[label].append(
+                    self.measure(client, path, options['repeat'])
+                )
+
+        self.stdout.write(f'{"строк в избранном":<24}' + ''.join(
+            f'{count:>12}' for count in rows
+        ))
+        for label, timings in results.items():
+            self.stdout.write(f'{label:<24}' + ''.join(
+                f'{timing:>9.2f} мс' for timing in timings
+            ))
+        return results
+
+    def grow(self, model, viewer, target, user_ids, recipe_ids, rng):
+        """Adds rows of other users to ``model`` until they are about
+        ``target``; duplicates are skipped."""
+        if len(user_ids) * len(recipe_ids) < target * 2:
+            raise CommandError(
+                f'Пользователей и рецептов слишком мало для {target} строк'
+            )
+        missing = target - model.objects.exclude(user=viewer).count()
+        while missing > 0:
+            batch = [
+                model(user_id=rng.choice(user_ids),
+                      recipe_id=rng.choice(recipe_ids))
+                for _ in range(min(missing, 5000))
+            ]
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            missing = target - model.objects.exclude(user=viewer).count()
+
+    def measure(self, client, path, repeat):
+        """Median SQL time of ``path`` in milliseconds."""
+        timings = []
+        for _ in range(repeat):
+            collector = SQLCollector()
+            with connection.execute_wrapper(collector):
+                response = client.get(path)
+            if response.status_code != 200:
+                raise CommandError(f'{path}: статус {response.status_code}')
+            timings.append(collector.time * 1000)
+        return statistics.median(timings)
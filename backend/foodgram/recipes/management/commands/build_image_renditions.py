@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes import response_cache
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт уменьшенные копии фото рецептов, загруженных до '
+            'появления копий')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(image_hash='').exclude(
+            image=''
+        ).exclude(image__isnull=True).only('id', 'image', 'image_hash')
+        processed = 0
+        for recipe in recipes.iterator():
+            try:
+                process_recipe_image(recipe)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            processed += 1
+        if processed:
+            response_cache.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано фото: {processed}'
+        ))
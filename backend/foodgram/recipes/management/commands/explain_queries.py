@@ -0,0 +1,183 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.http import QueryDict
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from recipes.filters import RecipeFilter
+from recipes.models import (Bookmark, Follow, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, ShoppingList, Tag,
+                            TimelineEntry, User)
+from recipes.pagination import CustomPagination
+from recipes.seeding import seed_database
+from recipes.timeline import home_timeline
+from recipes.views import RecipeViewSet
+
+# Tables that grow with the number of users and recipes; the tag and
+# ingredient catalogs are small enough to be scanned.
+LARGE_TABLES = {
+    model._meta.db_table for model in (
+        Bookmark, Follow, Recipe, Recipe.tags.through, RecipeIngredient,
+        ShoppingCartIngredient, ShoppingList, TimelineEntry, User,
+    )
+}
+
+SQLITE_SCAN = re.compile(r'SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+# SQLite names a table of a subquery by its alias, e.g. U0.
+DJANGO_ALIAS = re.compile(r'[A-Z]\d+')
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def filtered_recipes(viewer, query=''):
+    """Recipe list query of ``viewer`` built by the API filters."""
+    request = RequestFactory().get('/api/recipes/')
+    request.user = viewer
+    return RecipeFilter(
+        QueryDict(query),
+        queryset=Recipe.objects.with_user_flags(viewer),
+        request=request,
+    ).qs.order_by('-pub_date', '-id')[:6]
+
+
+def build_queries(viewer):
+    """(label, SQL, params) of the queries behind the hot API paths."""
+    recipe = Recipe.objects.filter(author=viewer).first()
+    followee = Follow.objects.filter(follower=viewer).first().followee_id
+    tags = Tag.objects.values_list('slug', flat=True)[:2]
+    tag = Tag.objects.first()
+    paginator = CustomPagination()
+    paginator.ordering = RecipeViewSet.cursor_orderings['list']
+    position = Recipe.objects.order_by(*paginator.ordering).values_list(
+        'pub_date', 'id'
+    )[Recipe.objects.count() // 2]
+
+    querysets = [
+        ('recipes-list', filtered_recipes(viewer)),
+        ('recipes-list[cursor]', Recipe.objects.with_user_flags(
+            viewer
+        ).filter(paginator.after(position)).order_by(
+            *paginator.ordering
+        )[:6]),
+        ('recipes-list[author]',
+         filtered_recipes(viewer, f'author={followee}')),
+        ('recipes-list[tags]', filtered_recipes(viewer, f'tags={tag.slug}')),
+        ('recipes-list[tags_mode=all]', filtered_recipes(
+            viewer, '&'.join(f'tags={slug}' for slug in tags)
+            + '&tags_mode=all'
+        )),
+        ('recipes-list[is_favorited]',
+         filtered_recipes(viewer, 'is_favorited=1')),
+        ('recipes-list[is_in_shopping_cart]',
+         filtered_recipes(viewer, 'is_in_shopping_cart=1')),
+        ('recipes-list[is_favorited=0]',
+         filtered_recipes(viewer, 'is_favorited=0')),
+        ('recipes-list[is_in_shopping_cart=0]',
+         filtered_recipes(viewer, 'is_in_shopping_cart=0')),
+        ('recipes-timeline', home_timeline(
+            Recipe.objects.with_user_flags(viewer), viewer
+        )[:6]),
+        ('recipe-ingredients',
+         RecipeIngredient.objects.filter(recipe_id=recipe.id)),
+        ('recipe-shopping-carts', ShoppingList.objects.filter(
+            recipe_id=recipe.id
+        ).values_list('user_id', flat=True)),
+        ('recipe-bookmarks', Bookmark.objects.filter(
+            recipe_id=recipe.id
+        ).values_list('user_id', flat=True)),
+        ('favorite-exists', Bookmark.objects.filter(
+            user=viewer, recipe_id=recipe.id
+        ).values('id')[:1]),
+        ('users-subscriptions', User.objects.filter(
+            followee__follower=viewer
+        ).annotate(follow_id=F('followee__id')).order_by('-follow_id')[:6]),
+        ('author-followers', Follow.objects.filter(
+            followee_id=followee
+        ).values_list('follower_id', flat=True)),
+        ('timeline-clean-up', TimelineEntry.objects.filter(
+            user=viewer, author_id=followee
+        )),
+        ('recipes-download-shopping-cart', ShoppingCartIngredient.objects
+         .filter(user=viewer)
+         .values_list('ingredient__name', 'ingredient__measurement_unit',
+                      'amount')
+         .order_by('ingredient__name')),
+    ]
+    queries = [
+        (label, *queryset.query.sql_with_params())
+        for label, queryset in querysets
+    ]
+    latest = Recipe.objects.latest_per_author([followee], 3)
+    queries.append(('users-subscriptions[recipes]', latest.raw_query,
+                    latest.params))
+    return queries
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы выполнения основных запросов API на тестовой '
+            'базе и проверяет, что большие таблицы читаются по индексам')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=5000,
+                            help='Количество рецептов в тестовой базе')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(
+                f'Планы запросов {connection.vendor} не поддерживаются'
+            )
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            viewer = seed_database(options['size'], seed=options['seed'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            failures = []
+            for label, sql, params in build_queries(viewer):
+                plan = self.explain(sql, params)
+                scanned = self.full_scans(plan)
+                if scanned:
+                    failures.append(f'{label}: {", ".join(scanned)}')
+                status = (self.style.ERROR('СКАН') if scanned
+                          else self.style.SUCCESS('OK'))
+                self.stdout.write(f'{label:<40} {status}')
+                if options['verbosity'] > 1 or scanned:
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError(
+                'Полное чтение больших таблиц:\n' + '\n'.join(failures)
+            )
+
+    def explain(self, sql, params):
+        prefix = (
+            'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite'
+            else 'EXPLAIN'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+        return [row[-1] for row in rows]
+
+    def full_scans(self, plan):
+        """Large tables read from start to end according to ``plan``."""
+        pattern = (
+            SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRESQL_SCAN
+        )
+        scanned = []
+        for line in plan:
+            match = pattern.search(line.strip())
+            if match and (match.group(1) in LARGE_TABLES
+                          or DJANGO_ALIAS.fullmatch(match.group(1))):
+                scanned.append(match.group(1))
+        return scanned
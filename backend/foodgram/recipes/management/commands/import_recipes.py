@@ -0,0 +1,228 @@
+import json
+import sys
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from recipes import cookable, response_cache, timeline
+from recipes.counters import count_inserted
+from recipes.images import (RecipeImageField, file_hash,
+                            process_recipe_image)
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, User
+from recipes.utils import bulk_create_returning_ids
+
+
+# The largest value of an IntegerField on every backend.
+MAX_INTEGER = 2 ** 31 - 1
+
+
+class InvalidRecipe(Exception):
+    pass
+
+
+def positive_int(value, message):
+    if isinstance(value, bool):
+        raise InvalidRecipe(message)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise InvalidRecipe(message)
+    if not 0 < value <= MAX_INTEGER:
+        raise InvalidRecipe(message)
+    return value
+
+
+class Command(BaseCommand):
+    help = ('Импортирует рецепты из файла NDJSON, по одному JSON-объекту '
+            'на строку: {"author": "email", "name": "...", "text": "...", '
+            '"cooking_time": 10, "tags": ["breakfast"], "ingredients": '
+            '[{"id": 1, "amount": 100} или {"name": "...", '
+            '"measurement_unit": "г", "amount": 100}], "image": '
+            '"data:image/png;base64,..."}')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или - для stdin')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--author', help='Email автора для строк без поля author'
+        )
+
+    def handle(self, *args, **options):
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredient_ids = set(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.ingredients = {
+            (name.lower(), measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.default_author = options['author']
+        self.image_field = RecipeImageField()
+
+        source = (sys.stdin if options['path'] == '-'
+                  else open(options['path'], encoding='utf-8'))
+        imported = skipped = 0
+        with source:
+            lines = enumerate(source, start=1)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                created, errors = self.import_batch(batch)
+                imported += created
+                skipped += len(errors)
+                for line_number, error in errors:
+                    self.stderr.write(f'Строка {line_number}: {error}')
+                self.stdout.write(f'Импортировано рецептов: {imported}')
+
+        if skipped:
+            raise CommandError(
+                f'Импортировано {imported}, пропущено с ошибками {skipped}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано рецептов: {imported}'
+        ))
+
+    def import_batch(self, lines):
+        """Inserts a batch in one transaction with a few multi-row
+        statements: recipes, their ingredients and their tags, then bumps
+        the authors' recipe counters and fills the followers' timelines."""
+        records, errors = [], []
+        for line_number, line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                errors.append((line_number, f'некорректный JSON: {error}'))
+                continue
+            if not isinstance(record, dict):
+                errors.append((line_number, 'ожидается JSON-объект'))
+                continue
+            try:
+                self.check_record(record)
+            except InvalidRecipe as error:
+                errors.append((line_number, error))
+                continue
+            records.append((line_number, record))
+
+        emails = {self.author(record) for _, record in records}
+        authors = dict(
+            User.objects.filter(email__in=emails).values_list('email', 'id')
+        )
+
+        recipes, relations = [], []
+        for line_number, record in records:
+            try:
+                recipe = self.build_recipe(record, authors)
+                relation = (
+                    self.ingredient_amounts(record), self.tag_ids(record)
+                )
+            except (InvalidRecipe, ValidationError) as error:
+                errors.append((line_number, error))
+                continue
+            recipes.append(recipe)
+            relations.append(relation)
+
+        with transaction.atomic():
+            recipes = bulk_create_returning_ids(Recipe, recipes)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe_id=recipe.id,
+                                 ingredient_id=ingredient_id,
+                                 amount=amount)
+                for recipe, (amounts, _) in zip(recipes, relations)
+                for ingredient_id, amount in amounts.items()
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe, (_, tag_ids) in zip(recipes, relations)
+                for tag_id in tag_ids
+            )
+            count_inserted(Recipe, recipes)
+            timeline.fan_out(recipes)
+            cookable.invalidate()
+            response_cache.invalidate_all()
+            for recipe in recipes:
+                if recipe.image:
+                    process_recipe_image(recipe)
+        return len(recipes), errors
+
+    def author(self, record):
+        return record.get('author') or self.default_author
+
+    def check_record(self, record):
+        """Checks the types and lengths of the fields, so that a bad
+        record is skipped alone instead of failing its batch."""
+        if not isinstance(self.author(record), str):
+            raise InvalidRecipe('не указан email автора')
+        for field in ('name', 'text'):
+            value = record.get(field)
+            if not isinstance(value, str) or not value.strip():
+                raise InvalidRecipe(f'поле {field} должно быть строкой')
+            max_length = Recipe._meta.get_field(field).max_length
+            if len(value) > max_length:
+                raise InvalidRecipe(
+                    f'поле {field} длиннее {max_length} символов'
+                )
+        for field in ('ingredients', 'tags'):
+            if not isinstance(record.get(field) or [], list):
+                raise InvalidRecipe(f'поле {field} должно быть списком')
+        if not isinstance(record.get('image') or '', str):
+            raise InvalidRecipe('поле image должно быть строкой')
+
+    def build_recipe(self, record, authors):
+        author = self.author(record)
+        if author not in authors:
+            raise InvalidRecipe(f'автор {author} не найден')
+        cooking_time = positive_int(
+            record.get('cooking_time'),
+            'время приготовления должно быть больше 0',
+        )
+        image = record.get('image')
+        if image:
+            image = self.image_field.to_internal_value(image)
+        return Recipe(
+            author_id=authors[author],
+            name=record['name'],
+            text=record['text'],
+            cooking_time=cooking_time,
+            image=image or None,
+            image_hash=file_hash(image) if image else '',
+        )
+
+    def ingredient_amounts(self, record):
+        amounts = {}
+        for ingredient in record.get('ingredients') or ():
+            if not isinstance(ingredient, dict):
+                raise InvalidRecipe(f'некорректный ингредиент {ingredient}')
+            ingredient_id = ingredient.get('id')
+            if ingredient_id is None:
+                ingredient_id = self.ingredients.get((
+                    str(ingredient.get('name', '')).lower(),
+                    str(ingredient.get('measurement_unit')),
+                ))
+            if (not isinstance(ingredient_id, int)
+                    or isinstance(ingredient_id, bool)
+                    or ingredient_id not in self.ingredient_ids):
+                raise InvalidRecipe(f'неизвестный ингредиент {ingredient}')
+            if ingredient_id in amounts:
+                raise InvalidRecipe('ингредиенты не должны повторяться')
+            amounts[ingredient_id] = positive_int(
+                ingredient.get('amount'), 'количество должно быть больше 0'
+            )
+        if not amounts:
+            raise InvalidRecipe('не указаны ингредиенты')
+        return amounts
+
+    def tag_ids(self, record):
+        tag_ids = set()
+        for slug in record.get('tags') or ():
+            if not isinstance(slug, str) or slug not in self.tags:
+                raise InvalidRecipe(f'неизвестный тег {slug}')
+            tag_ids.add(self.tags[slug])
+        return tag_ids
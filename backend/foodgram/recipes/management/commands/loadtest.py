@@ -0,0 +1,218 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+READ_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name=мо',
+    '/api/recipes/?limit=6',
+)
+AUTHENTICATED_PATHS = (
+    '/api/recipes/download_shopping_cart/?format=csv',
+)
+
+
+class Target:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError(f'Ожидался адрес вида http://host:port: {url}')
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def request(self, path, token=None):
+        lines = [
+            f'GET {quote(path, safe="/?=&%,")} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Accept: */*',
+        ]
+        if token:
+            lines.append(f'Authorization: Token {token}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode()
+
+    def percentile(self, share):
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+async def read_response(reader):
+    """Reads one response, returns its status and whether the server
+    closes the connection."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Соединение закрыто')
+    status = int(status_line.split()[1])
+    length, chunked, close = None, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value
+        elif name == 'connection':
+            close = value == 'close'
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+async def client(target, requests, remaining, timeout):
+    """Sends requests over a keep-alive connection, reconnecting when the
+    server closes it, until ``remaining`` runs out."""
+    reader = writer = None
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        request = requests[remaining[0] % len(requests)]
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(target.host, target.port),
+                    timeout,
+                )
+            writer.write(request)
+            status, close = await asyncio.wait_for(
+                read_response(reader), timeout
+            )
+        except (OSError, ValueError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError):
+            target.errors += 1
+            close = True
+        else:
+            target.latencies.append(time.perf_counter() - start)
+            target.statuses[status] = target.statuses.get(status, 0) + 1
+        if close and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def slow_client(target, stop):
+    """Holds a connection sending a request body one byte a second, as a
+    client on a poor mobile network does."""
+    try:
+        reader, writer = await asyncio.open_connection(
+            target.host, target.port
+        )
+        writer.write((
+            f'POST /api/auth/token/login/ HTTP/1.1\r\n'
+            f'Host: {target.host}:{target.port}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: 1000000\r\n\r\n'
+        ).encode())
+        while not stop.is_set():
+            writer.write(b' ')
+            await writer.drain()
+            try:
+                await asyncio.wait_for(stop.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+        writer.close()
+    except OSError:
+        pass
+
+
+async def run_load(target, requests, options):
+    stop = asyncio.Event()
+    slow = [
+        asyncio.ensure_future(slow_client(target, stop))
+        for _ in range(options['slow_clients'])
+    ]
+    if slow:
+        # Let the slow clients occupy the server first.
+        await asyncio.sleep(1)
+    remaining = [options['requests']]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(target, requests, remaining, options['timeout'])
+        for _ in range(options['concurrency'])
+    ))
+    target.elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*slow)
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенные серверы API запросами на чтение и '
+            'сравнивает пропускную способность и задержки, например WSGI '
+            'и ASGI')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+',
+                            help='Адреса серверов, например '
+                                 'http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Путь запроса, можно указать несколько раз')
+        parser.add_argument('--token',
+                            help='Токен пользователя для запросов и '
+                                 'выгрузки списка покупок')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--timeout', type=float, default=10,
+                            help='Сколько секунд ждать ответа')
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Сколько медленных клиентов держат соединения во время '
+                 'нагрузки'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or list(READ_PATHS) + (
+            list(AUTHENTICATED_PATHS) if options['token'] else []
+        )
+        targets = [Target(url) for url in options['urls']]
+        for target in targets:
+            requests = [
+                target.request(path, options['token']) for path in paths
+            ]
+            asyncio.run(run_load(target, requests, options))
+
+        self.stdout.write(
+            f'{"сервер":<28}{"запр/с":>10}{"p50":>10}{"p95":>10}'
+            f'{"p99":>10}{"max":>10}  ответы'
+        )
+        for target in targets:
+            if not target.latencies:
+                self.stdout.write(f'{target.url:<28}нет ответов, '
+                                  f'ошибок: {target.errors}')
+                continue
+            timings = ''.join(
+                f'{value * 1000:>8.1f}мс' for value in (
+                    statistics.median(target.latencies),
+                    target.percentile(0.95), target.percentile(0.99),
+                    max(target.latencies),
+                )
+            )
+            statuses = ', '.join(
+                f'{status}: {count}'
+                for status, count in sorted(target.statuses.items())
+            )
+            if target.errors:
+                statuses += f', ошибки: {target.errors}'
+            self.stdout.write(
+                f'{target.url:<28}'
+                f'{len(target.latencies) / target.elapsed:>10.1f}'
+                f'{timings}  {statuses}'
+            )
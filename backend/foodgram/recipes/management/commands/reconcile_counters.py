@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes import timeline
+from recipes.counters import reconcile
+from recipes.utils import rebuild_shopping_carts
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики рецептов, избранного, списков покупок '
+            'и подписок, исправляя расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shopping-carts', action='store_true',
+            help='Также пересобрать суммы ингредиентов в списках покупок'
+        )
+        parser.add_argument(
+            '--timelines', action='store_true',
+            help='Также пересобрать ленты подписок'
+        )
+
+    def handle(self, *args, **options):
+        for counter, fixed in reconcile().items():
+            self.stdout.write(
+                f'{counter.model._meta.verbose_name_plural}, '
+                f'{counter.field}: исправлено {fixed}'
+            )
+        if options['shopping_carts']:
+            rows = rebuild_shopping_carts()
+            self.stdout.write(f'Списки покупок пересобраны, строк: {rows}')
+        if options['timelines']:
+            timeline.rebuild()
+            self.stdout.write('Ленты подписок пересобраны')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
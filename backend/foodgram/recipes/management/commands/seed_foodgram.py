@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from recipes.seeding import PASSWORD, Seeder
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, списками покупок и подписками для нагрузочного '
+            'тестирования')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200000)
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--bookmarks', type=int, default=3000000)
+        parser.add_argument('--carts', type=int, default=1000000)
+        parser.add_argument('--follows', type=int, default=2000000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора, одно зерно — одни данные')
+        parser.add_argument('--skew', type=float, default=2.0,
+                            help='Перекос популярности, 1 — равномерно')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            seed=options['seed'],
+            skew=options['skew'],
+            batch_size=options['batch_size'],
+            log=self.log if options['verbosity'] > 1 else None,
+        )
+        seeder.run(
+            users=options['users'],
+            recipes=options['recipes'],
+            bookmarks=options['bookmarks'],
+            carts=options['carts'],
+            follows=options['follows'],
+        )
+        seeder.reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(seeder.user_ids)}, '
+            f'рецептов: {len(seeder.recipe_ids)}. Пароль: {PASSWORD}'
+        ))
+
+    def log(self, message):
+        self.stdout.write(message)
@@ -0,0 +1,215 @@
+"""Per-request timings and latency histograms per route.
+
+``ServerTimingMiddleware`` measures every request: the number and the time
+of SQL queries, the time of serializers and the total time, reported in
+the ``Server-Timing`` header and added to the histograms of the route.
+
+Every worker keeps its histograms in memory and copies them to the cache
+at most every ``METRICS_FLUSH_INTERVAL`` seconds; ``/api/metrics`` sums
+the copies of all workers into the Prometheus text format. With the
+default per-process cache it shows only the worker answering it.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseForbidden
+
+KEY_PREFIX = 'metrics'
+WORKERS_KEY = f'{KEY_PREFIX}_workers'
+WORKER_TIMEOUT = 60 * 60 * 24
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statistics of a route are the counts of its histogram buckets followed
+# by these sums.
+HISTOGRAM_SIZE = len(BUCKETS) + 1
+SUMS = ('duration', 'sql', 'queries', 'serialize')
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """Timings of one request; it is also a database execute wrapper
+    counting the queries."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.serialize = 0.0
+        self.depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+
+    def header(self, duration):
+        return (
+            f'db;dur={self.sql * 1000:.2f};desc="{self.queries} queries", '
+            f'serialize;dur={self.serialize * 1000:.2f}, '
+            f'total;dur={duration * 1000:.2f}'
+        )
+
+
+def start_request():
+    _local.timings = RequestTimings()
+    return _local.timings
+
+
+def finish_request():
+    _local.timings = None
+
+
+@contextmanager
+def serializing():
+    """Adds the time of the outermost serializer to the request, without
+    the queries it makes."""
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        yield
+        return
+    timings.depth += 1
+    start, sql = time.perf_counter(), timings.sql
+    try:
+        yield
+    finally:
+        timings.depth -= 1
+        if not timings.depth:
+            timings.serialize += (
+                time.perf_counter() - start - (timings.sql - sql)
+            )
+
+
+class TimedSerializerMixin:
+    """Reports the time spent in the serializer to the request metrics."""
+
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.responses = {}
+        self.worker_key = f'{KEY_PREFIX}:{os.getpid()}:{time.time()}'
+        self.flushed = 0.0
+
+    def record(self, route, method, status, duration, timings):
+        key = (route, method)
+        with self.lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = [0] * (HISTOGRAM_SIZE + len(SUMS))
+            stats[bisect.bisect_left(BUCKETS, duration)] += 1
+            for offset, value in enumerate((
+                    duration, timings.sql, timings.queries,
+                    timings.serialize)):
+                stats[HISTOGRAM_SIZE + offset] += value
+            key = (route, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            now = time.monotonic()
+            flush = now - self.flushed >= settings.METRICS_FLUSH_INTERVAL
+            if flush:
+                self.flushed = now
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'routes': {key: list(stats)
+                           for key, stats in self.routes.items()},
+                'responses': dict(self.responses),
+            }
+
+    def flush(self):
+        cache.set(self.worker_key, self.snapshot(), WORKER_TIMEOUT)
+        workers = cache.get(WORKERS_KEY) or set()
+        if self.worker_key not in workers:
+            cache.set(WORKERS_KEY, workers | {self.worker_key},
+                      WORKER_TIMEOUT)
+
+    def collect(self):
+        """Sums of the snapshots of all workers, this one being current."""
+        snapshots = cache.get_many(
+            (cache.get(WORKERS_KEY) or set()) - {self.worker_key}
+        )
+        routes, responses = {}, {}
+        for snapshot in [self.snapshot(), *snapshots.values()]:
+            for key, stats in snapshot['routes'].items():
+                total = routes.setdefault(key, [0] * len(stats))
+                for index, value in enumerate(stats):
+                    total[index] += value
+            for key, count in snapshot['responses'].items():
+                responses[key] = responses.get(key, 0) + count
+        return routes, responses
+
+
+registry = Registry()
+
+
+def render(routes, responses):
+    """Histograms and counters in the Prometheus text format."""
+    lines = [
+        '# HELP foodgram_request_duration_seconds Время ответа.',
+        '# TYPE foodgram_request_duration_seconds histogram',
+    ]
+    for (route, method), stats in sorted(routes.items()):
+        labels = f'route="{route}",method="{method}"'
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, '+Inf'), stats[:HISTOGRAM_SIZE]):
+            cumulative += count
+            lines.append(
+                f'foodgram_request_duration_seconds_bucket'
+                f'{{{labels},le="{bound}"}} {cumulative}'
+            )
+        lines.append(
+            f'foodgram_request_duration_seconds_sum{{{labels}}} '
+            f'{stats[HISTOGRAM_SIZE + SUMS.index("duration")]}'
+        )
+        lines.append(
+            f'foodgram_request_duration_seconds_count{{{labels}}} '
+            f'{cumulative}'
+        )
+    for name, help_text, total in (
+            ('foodgram_request_sql_seconds_total',
+             'Время SQL-запросов.', 'sql'),
+            ('foodgram_request_sql_queries_total',
+             'Число SQL-запросов.', 'queries'),
+            ('foodgram_request_serialize_seconds_total',
+             'Время сериализаторов без SQL-запросов.', 'serialize')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (route, method), stats in sorted(routes.items()):
+            lines.append(
+                f'{name}{{route="{route}",method="{method}"}} '
+                f'{stats[HISTOGRAM_SIZE + SUMS.index(total)]}'
+            )
+    lines.append('# HELP foodgram_responses_total Ответы по статусам.')
+    lines.append('# TYPE foodgram_responses_total counter')
+    for (route, method, status), count in sorted(responses.items()):
+        lines.append(
+            f'foodgram_responses_total{{route="{route}",method="{method}",'
+            f'status="{status}"}} {count}'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render(*registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
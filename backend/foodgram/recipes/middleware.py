@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import metrics
+from .nplusone import NPlusOneDetected, QueryFingerprints, logger
+
+UNMATCHED_ROUTE = 'unmatched'
+
+
+class ServerTimingMiddleware:
+    """Reports the timings of a request in the ``Server-Timing`` header and
+    records them in the histograms of its route, see ``metrics``.
+
+    A streaming response is recorded once it is sent, with the queries
+    made while it is produced; its header has the timings until then.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = metrics.start_request()
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request()
+        duration = time.perf_counter() - timings.start
+        response['Server-Timing'] = timings.header(duration)
+
+        match = request.resolver_match
+        route = match.url_name if match and match.url_name else (
+            UNMATCHED_ROUTE
+        )
+        if response.streaming:
+            response.streaming_content = self.record_stream(
+                response.streaming_content, request, response, route,
+                timings,
+            )
+        else:
+            metrics.registry.record(
+                route, request.method, response.status_code, duration,
+                timings,
+            )
+        return response
+
+    def record_stream(self, content, request, response, route, timings):
+        try:
+            with connection.execute_wrapper(timings):
+                yield from content
+        finally:
+            metrics.registry.record(
+                route, request.method, response.status_code,
+                time.perf_counter() - timings.start, timings,
+            )
+
+
+class NPlusOneMiddleware:
+    """Reports queries repeated by a request, see ``nplusone``.
+
+    ``NPLUSONE_MODE`` is ``warn`` to log them, ``raise`` to fail the
+    request (tests, benchmarks) or ``off``.
+    """
+
+    def __init__(self, get_response):
+        if settings.NPLUSONE_MODE not in ('warn', 'raise'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        fingerprints = QueryFingerprints(settings.NPLUSONE_THRESHOLD)
+        with connection.execute_wrapper(fingerprints):
+            response = self.get_response(request)
+        if fingerprints.repeated():
+            report = fingerprints.report(
+                f'{request.method} {request.get_full_path()}'
+            )
+            if settings.NPLUSONE_MODE == 'raise':
+                raise NPlusOneDetected(report)
+            logger.warning('N+1 запросы\n%s', report)
+        return response
@@ -0,0 +1,49 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:58
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('users', 'CustomUser', 'recipes_count', 'Recipe', 'author'),
+    ('users', 'CustomUser', 'followers_count', 'Follow', 'followee'),
+    ('users', 'CustomUser', 'following_count', 'Follow', 'follower'),
+    ('recipes', 'Recipe', 'favorites_count', 'Bookmark', 'recipe'),
+    ('recipes', 'Recipe', 'shopping_carts_count', 'ShoppingList', 'recipe'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app_label, model_name, field, source_name, source_field in COUNTERS:
+        source = apps.get_model('recipes', source_name)
+        apps.get_model(app_label, model_name).objects.update(**{
+            field: Coalesce(models.Subquery(
+                source.objects
+                .filter(**{source_field: models.OuterRef('pk')})
+                .order_by()
+                .values(source_field)
+                .annotate(total=models.Count('pk'))
+                .values('total')
+            ), 0)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_counters'),
+        ('recipes', '0008_shopping_cart_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    """
+    CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector()
+    """,
+    """
+    UPDATE recipes_recipe SET search_vector =
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    """,
+    """
+    CREATE INDEX recipes_recipe_search_vector_idx
+    ON recipes_recipe USING GIN (search_vector)
+    """,
+)
+
+POSTGRESQL_BACKWARD = (
+    'DROP TRIGGER recipes_recipe_search_vector_update ON recipes_recipe',
+    'DROP FUNCTION recipes_recipe_search_vector()',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+
+
+def run_postgresql(statements):
+    def run(apps, schema_editor):
+        # SQLite gets its FTS5 index from recipes.fulltext after migrate.
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_timeline_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_postgresql(POSTGRESQL_FORWARD),
+            run_postgresql(POSTGRESQL_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """Copies the latest recipes of every followed author who is not a
+    celebrity into the timelines of the follows made before timelines."""
+    Follow = apps.get_model('recipes', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    authors = User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lt=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).order_by('id').values_list('id', flat=True)
+    for author_id in authors.iterator():
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-id')
+            .values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL]
+        )
+        followers = Follow.objects.filter(
+            followee_id=author_id
+        ).values_list('follower_id', flat=True)
+        entries = [
+            TimelineEntry(user_id=follower_id, recipe_id=recipe_id,
+                          author_id=author_id, pub_date=pub_date)
+            for follower_id in followers.iterator()
+            for recipe_id, pub_date in recipes
+        ]
+        TimelineEntry.objects.bulk_create(
+            entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_custom_user_manager'),
+        ('recipes', '0014_model_options_and_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
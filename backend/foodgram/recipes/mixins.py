@@ -1,17 +1,24 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
+from . import catalog, response_cache
 from .models import Recipe
 from .serializers import RecipeMinifiedSerializer
 
 
 class CustomCreateDeleteObjSerializerMixin:
+    @transaction.atomic
     def delete_obj(self, model, request, pk):
         obj = get_object_or_404(model, recipe_id=pk, user=request.user)
         obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @transaction.atomic
     def create_obj(self, serializer, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         data = {
@@ -27,3 +34,90 @@ class CustomCreateDeleteObjSerializerMixin:
             RecipeMinifiedSerializer(recipe).data,
             status=status.HTTP_201_CREATED
         )
+
+
+class CatalogListMixin:
+    """Serves ``list`` from a pre-rendered body with ETag support."""
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        body = catalog.get_body(self.catalog_name, lambda: self.get_serializer(
+            self.get_queryset(), many=True
+        ).data)
+        return catalog.catalog_response(request, body)
+
+
+class ResponseCacheMixin:
+    """Serves anonymous ``list`` and ``retrieve`` responses rendered as JSON
+    from the cache, see ``response_cache``."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        key = None
+        if request.accepted_renderer.format == 'json':
+            key = response_cache.cache_key(
+                request, self.action, kwargs.get(self.lookup_field)
+            )
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        content = cache.get(key)
+        if content is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = request.accepted_renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context(),
+            )
+            cache.set(key, content, settings.RECIPE_CACHE_TIMEOUT)
+        return HttpResponse(
+            content, content_type=request.accepted_renderer.media_type
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryLog:
+    """Database execute wrapper keeping the SQL of the queries it runs."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMixin:
+    """Fails a request which issues more SQL queries than its action allows.
+
+    Budgets are declared per action in ``query_budgets`` and are only
+    checked when ``settings.QUERY_BUDGET_ENFORCE`` is on (tests, benchmarks).
+    """
+    query_budgets = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        if not getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+            return super().dispatch(request, *args, **kwargs)
+
+        log = QueryLog()
+        with connection.execute_wrapper(log):
+            response = super().dispatch(request, *args, **kwargs)
+        budget = self.query_budgets.get(getattr(self, 'action', None))
+        if budget is not None and len(log.queries) > budget:
+            raise QueryBudgetExceeded(
+                f'{self.__class__.__name__}.{self.action}: '
+                f'{len(log.queries)} queries, budget is {budget}\n'
+                + '\n'.join(log.queries)
+            )
+        return response
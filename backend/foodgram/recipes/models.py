@@ -1,6 +1,14 @@
 from django.db import models
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, Window)
+from django.db.models.functions import RowNumber
 from django.contrib.auth import get_user_model
 
+from users.deletion import BatchedDeleteMixin, BatchedDeleteQuerySet
+from users.models import DenormalizedFieldsMixin
+
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -47,7 +55,58 @@ class Ingredient(models.Model):
         return f"{self.name} ({self.measurement_unit})"
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(BatchedDeleteQuerySet):
+    def with_user_flags(self, user):
+        if user is None or not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Bookmark.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        """Up to ``limit`` most recent recipes of every author in one query
+        numbering the recipes of each author with ROW_NUMBER."""
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset.order_by('author_id', '-pub_date', '-id')
+        sql, params = queryset.order_by().annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )).query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+            f'ORDER BY author_id, row_number',
+            (*params, limit),
+        )
+
+    def with_related(self, user):
+        queryset = self.prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+        if user is None or not user.is_authenticated:
+            return queryset.select_related('author')
+        return queryset.prefetch_related(Prefetch(
+            'author',
+            queryset=User.objects.annotate(is_subscribed=Exists(
+                Follow.objects.filter(follower=user, followee=OuterRef('pk'))
+            ))
+        ))
+
+
+class Recipe(BatchedDeleteMixin, DenormalizedFieldsMixin, models.Model):
     name = models.CharField(
         'Название',
         max_length=100
@@ -61,15 +120,24 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Фото',
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
     )
 
+    image_hash = models.CharField(
+        'Хэш фото',
+        max_length=64,
+        blank=True,
+        editable=False,
+    )
+
     author = models.ForeignKey(
         User,
         verbose_name='Автор',
         on_delete=models.CASCADE,
         related_name='recipes',
+        db_index=False,
     )
 
     ingredients = models.ManyToManyField(
@@ -96,10 +164,33 @@ class Recipe(models.Model):
         'Время приготовления',
     )
 
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+    )
+
+    shopping_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+    )
+
+    denormalized_fields = ('favorites_count', 'shopping_carts_count')
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_feed_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_feed_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -131,21 +222,25 @@ class RecipeIngredient(models.Model):
         )]
 
 
-class Follow(models.Model):
+class Follow(BatchedDeleteMixin, models.Model):
     follower = models.ForeignKey(
         User,
         verbose_name='Подписчик',
         on_delete=models.CASCADE,
-        related_name='follower'
+        related_name='follower',
+        db_index=False,
     )
 
     followee = models.ForeignKey(
         User,
         verbose_name='Автор',
         on_delete=models.CASCADE,
-        related_name='followee'
+        related_name='followee',
+        db_index=False,
     )
 
+    objects = BatchedDeleteQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -153,12 +248,16 @@ class Follow(models.Model):
             fields=['follower', 'followee'],
             name='follow_unique'
         )]
+        indexes = [models.Index(
+            fields=['followee', 'follower'],
+            name='follow_followee_idx'
+        )]
 
     def __str__(self):
         return f"{self.follower} подписан на {self.followee}"
 
 
-class Bookmark(models.Model):
+class Bookmark(BatchedDeleteMixin, models.Model):
     user = models.ForeignKey(
         User,
         verbose_name='Пользователь',
@@ -166,6 +265,7 @@ class Bookmark(models.Model):
         blank=False,
         null=False,
         related_name='bookmarks',
+        db_index=False,
     )
 
     recipe = models.ForeignKey(
@@ -175,8 +275,11 @@ class Bookmark(models.Model):
         blank=False,
         null=False,
         related_name='bookmarks',
+        db_index=False,
     )
 
+    objects = BatchedDeleteQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Закладка'
         verbose_name_plural = 'Закладки'
@@ -184,12 +287,16 @@ class Bookmark(models.Model):
             fields=['user', 'recipe'],
             name='bookmark_unique'
         )]
+        indexes = [models.Index(
+            fields=['recipe', 'user'],
+            name='bookmark_recipe_idx'
+        )]
 
     def __str__(self):
         return f"{self.recipe} в закладках у {self.user}"
 
 
-class ShoppingList(models.Model):
+class ShoppingList(BatchedDeleteMixin, models.Model):
     user = models.ForeignKey(
         User,
         verbose_name='Пользователь',
@@ -197,6 +304,7 @@ class ShoppingList(models.Model):
         blank=False,
         null=True,
         related_name='shopping_list',
+        db_index=False,
     )
 
     recipe = models.ForeignKey(
@@ -206,8 +314,11 @@ class ShoppingList(models.Model):
         blank=False,
         null=True,
         related_name='shopping_list',
+        db_index=False,
     )
 
+    objects = BatchedDeleteQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -215,6 +326,87 @@ class ShoppingList(models.Model):
             fields=['user', 'recipe'],
             name='recipe_unique'
         )]
+        indexes = [models.Index(
+            fields=['recipe', 'user'],
+            name='shopping_list_recipe_idx'
+        )]
 
     def __str__(self):
         return f"{self.recipe} в списке у {self.user}"
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+    )
+
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+    )
+
+    amount = models.IntegerField(
+        'Количество',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='shopping_cart_ingredient_unique'
+        )]
+
+    def __str__(self):
+        return f"{self.ingredient} — {self.amount} у {self.user}"
+
+
+class TimelineEntry(models.Model):
+    """A recipe in the home timeline of a follower of its author.
+
+    ``author`` and ``pub_date`` are copied from the recipe, so that the
+    timeline is read and cleaned up without joining recipes.
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='timeline_entry_unique'
+        )]
+        indexes = [models.Index(
+            fields=['user', '-pub_date', '-recipe'],
+            name='timeline_entry_feed_idx'
+        )]
+
+    def __str__(self):
+        return f"{self.recipe} в ленте {self.user}"
@@ -0,0 +1,87 @@
+"""Detection of N+1 queries: the same query run again and again with other
+parameters while a request is handled, usually once per object of a list.
+
+SQL is fingerprinted by collapsing lists of placeholders and literals, so
+``WHERE recipe_id = %s`` for every recipe of a page is one fingerprint.
+A fingerprint run ``NPLUSONE_THRESHOLD`` times or more is reported with
+the application frames of the stack that issued it.
+"""
+import logging
+import os
+import re
+import traceback
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+# Transaction control statements legitimately repeat.
+IGNORED = re.compile(r'\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO)\b',
+                     re.IGNORECASE)
+
+STACK_DEPTH = 4
+TRIGGER_DEPTH = 3
+INSTRUMENTATION = ('nplusone.py', 'metrics.py', 'middleware.py')
+
+
+class NPlusOneDetected(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    sql = PLACEHOLDER_LIST.sub('%s', sql)
+    sql = STRING.sub('?', sql)
+    return NUMBER.sub('?', sql)
+
+
+def query_stack():
+    """The frames that ran the query, followed by the project frames that
+    led to them, without the frames of the ORM and of the metrics."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if os.path.basename(frame.filename) not in INSTRUMENTATION
+        and f'{os.sep}django{os.sep}db{os.sep}' not in frame.filename
+    ]
+    trigger = frames[-TRIGGER_DEPTH:]
+    project = [
+        frame for frame in frames[:-TRIGGER_DEPTH]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and os.sep + 'management' + os.sep not in frame.filename
+        and os.path.basename(frame.filename) != 'manage.py'
+    ]
+    return ''.join(traceback.format_list(project[-STACK_DEPTH:] + trigger))
+
+
+class QueryFingerprints:
+    """Database execute wrapper counting the queries of a request by their
+    fingerprints."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = {}
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not IGNORED.match(sql):
+            key = fingerprint(sql)
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+            if count == self.threshold:
+                self.stacks[key] = query_stack()
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """``(fingerprint, count, stack)`` of the repeated queries."""
+        return [
+            (key, self.counts[key], stack)
+            for key, stack in self.stacks.items()
+        ]
+
+    def report(self, label):
+        return '\n\n'.join(
+            f'{label}: запрос выполнен {count} раз\n{key}\n{stack}'
+            for key, count, stack in self.repeated()
+        )
@@ -1,5 +1,132 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimated_count(queryset):
+    """Row count estimated by the PostgreSQL planner, exact elsewhere."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
 
 
 class CustomPagination(PageNumberPagination):
+    """Page number pagination with an opt-in keyset mode.
+
+    ``?cursor=`` switches a view action listed in the view's
+    ``cursor_orderings`` to keyset pagination: the page after the cursor
+    is found by comparing the ordering fields, without COUNT and OFFSET.
+    ``?count=estimate`` adds an estimated total to a keyset page.
+    """
     page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = None
+        if self.cursor_query_param in request.query_params:
+            self.ordering = getattr(view, 'cursor_orderings', {}).get(
+                getattr(view, 'action', None)
+            )
+        if self.ordering is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'estimate':
+            self.count = estimated_count(queryset)
+
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.after(position))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        del results[self.page_size:]
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        if self.ordering is None:
+            return super().get_paginated_response(data)
+        response = OrderedDict([('next', self.get_next_link())])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_next_link(self):
+        if self.ordering is None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.last)
+        )
+
+    def after(self, position):
+        """Condition selecting the rows that follow ``position`` in the
+        ordering, e.g. ``pub_date < p OR (pub_date = p AND id < i)``."""
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): value
+                for previous, value in zip(self.ordering[:index], position)
+            }
+            conditions.append(Q(
+                **equal, **{f'{name}__{lookup}': position[index]}
+            ))
+        return reduce(or_, conditions)
+
+    def encode_cursor(self, obj):
+        position = [
+            getattr(obj, field.lstrip('-')) for field in self.ordering
+        ]
+        position = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]
+        return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)) or not all(
+                isinstance(value, (str, int, float)) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position
@@ -0,0 +1,42 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос'
+    default_code = 'request_too_large'
+
+
+class BoundedParserMixin:
+    """Refuses a request body larger than ``RECIPE_REQUEST_MAX_SIZE``
+    before any of it is read.
+
+    DRF does not parse a body without ``Content-Length``, so the declared
+    length bounds what the parser reads.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = (parser_context or {}).get('request')
+        if request is not None:
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > settings.RECIPE_REQUEST_MAX_SIZE:
+                raise RequestTooLarge()
+        return super().parse(stream, media_type, parser_context)
+
+
+class BoundedJSONParser(BoundedParserMixin, JSONParser):
+    pass
+
+
+class BoundedFormParser(BoundedParserMixin, FormParser):
+    pass
+
+
+class BoundedMultiPartParser(BoundedParserMixin, MultiPartParser):
+    pass
@@ -0,0 +1,405 @@
+"""Minimal streaming PDF writer for plain text documents.
+
+Pages are written out as soon as they are filled, and the objects that
+depend on the whole document (page tree, font widths, cross-reference
+table) go after them, so memory does not grow with the document size.
+Text is set in an embedded TrueType font, which makes Cyrillic render
+the same in every viewer; only the outlines of the glyphs used by the
+document are embedded.
+"""
+import struct
+import zlib
+from functools import lru_cache
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 11
+LEADING = 16
+
+CATALOG, PAGES, FONT, CID_FONT, DESCRIPTOR, FONT_FILE, TO_UNICODE = range(
+    1, 8
+)
+# A subset font is named with a tag of six capital letters.
+FONT_NAME = 'FGSUBS+DejaVuSans'
+
+# Tables a PDF viewer needs to draw the glyphs of a TrueType font.
+SUBSET_TABLES = (
+    'cvt ', 'fpgm', 'glyf', 'head', 'hhea', 'hmtx', 'loca', 'maxp', 'prep'
+)
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+def checksum(data):
+    data += bytes(-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+def build_font(tables):
+    """TrueType font file made of ``tables`` ({tag: data})."""
+    tags = sorted(tables)
+    power = 1 << (len(tags).bit_length() - 1)
+    header = struct.pack(
+        '>IHHHH', 0x00010000, len(tags), power * 16,
+        power.bit_length() - 1, (len(tags) - power) * 16,
+    )
+    offset = len(header) + 16 * len(tags)
+    records, bodies, offsets = [], [], {}
+    for tag in tags:
+        data = tables[tag]
+        records.append(struct.pack(
+            '>4sIII', tag.encode('latin1'), checksum(data), offset, len(data)
+        ))
+        offsets[tag] = offset
+        bodies.append(data + bytes(-len(data) % 4))
+        offset += len(bodies[-1])
+    font = bytearray(header + b''.join(records) + b''.join(bodies))
+    struct.pack_into(
+        '>I', font, offsets['head'] + 8,
+        (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF,
+    )
+    return bytes(font)
+
+
+class TrueTypeFont:
+    """Glyph ids and advance widths read from a TrueType font file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as font_file:
+            self.data = font_file.read()
+        self.tables = {}
+        self.lengths = {}
+        num_tables = self.u16(4)
+        for index in range(num_tables):
+            record = 12 + index * 16
+            tag = self.data[record:record + 4].decode('latin1')
+            offset, length = struct.unpack_from('>II', self.data, record + 8)
+            self.tables[tag] = offset
+            self.lengths[tag] = length
+
+        head = self.tables['head']
+        self.units_per_em = self.u16(head + 18)
+        self.bbox = [
+            self.scale(value)
+            for value in struct.unpack_from('>4h', self.data, head + 36)
+        ]
+        hhea = self.tables['hhea']
+        self.ascent = self.scale(self.i16(hhea + 4))
+        self.descent = self.scale(self.i16(hhea + 6))
+        metrics_count = self.u16(hhea + 34)
+        hmtx = self.tables['hmtx']
+        self.advances = [
+            self.scale(self.u16(hmtx + index * 4))
+            for index in range(metrics_count)
+        ]
+        self.cmap = self.read_cmap()
+        self.glyph_offsets = self.read_loca()
+
+    def u16(self, offset):
+        return struct.unpack_from('>H', self.data, offset)[0]
+
+    def i16(self, offset):
+        return struct.unpack_from('>h', self.data, offset)[0]
+
+    def scale(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def read_cmap(self):
+        """Unicode BMP mapping from the (3, 1) format 4 subtable."""
+        cmap = self.tables['cmap']
+        for index in range(self.u16(cmap + 2)):
+            record = cmap + 4 + index * 8
+            platform, encoding = self.u16(record), self.u16(record + 2)
+            subtable = cmap + struct.unpack_from(
+                '>I', self.data, record + 4
+            )[0]
+            if (platform, encoding) == (3, 1) and self.u16(subtable) == 4:
+                break
+        else:
+            raise ValueError('Шрифт не содержит таблицы Unicode')
+
+        segments = self.u16(subtable + 6) // 2
+        ends = subtable + 14
+        starts = ends + segments * 2 + 2
+        deltas = starts + segments * 2
+        range_offsets = deltas + segments * 2
+        mapping = {}
+        for segment in range(segments):
+            start = self.u16(starts + segment * 2)
+            end = self.u16(ends + segment * 2)
+            delta = self.i16(deltas + segment * 2)
+            range_offset_at = range_offsets + segment * 2
+            range_offset = self.u16(range_offset_at)
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset == 0:
+                    glyph = (code + delta) & 0xFFFF
+                else:
+                    glyph = self.u16(
+                        range_offset_at + range_offset + (code - start) * 2
+                    )
+                    if glyph:
+                        glyph = (glyph + delta) & 0xFFFF
+                if glyph:
+                    mapping[code] = glyph
+        return mapping
+
+    def read_loca(self):
+        """Offsets of the glyphs in the ``glyf`` table, and its end."""
+        count = self.u16(self.tables['maxp'] + 4) + 1
+        loca = self.tables['loca']
+        if self.i16(self.tables['head'] + 50) == 0:
+            return [
+                offset * 2
+                for offset in struct.unpack_from(f'>{count}H', self.data, loca)
+            ]
+        return list(struct.unpack_from(f'>{count}I', self.data, loca))
+
+    def table(self, tag):
+        offset = self.tables[tag]
+        return self.data[offset:offset + self.lengths[tag]]
+
+    def components(self, glyph):
+        """Glyphs a composite glyph is made of."""
+        start = self.tables['glyf'] + self.glyph_offsets[glyph]
+        if (start == self.tables['glyf'] + self.glyph_offsets[glyph + 1]
+                or self.i16(start) >= 0):
+            return []
+        offset, components = start + 10, []
+        while True:
+            flags, component = struct.unpack_from('>HH', self.data, offset)
+            components.append(component)
+            if not flags & MORE_COMPONENTS:
+                return components
+            offset += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+            if flags & WE_HAVE_A_SCALE:
+                offset += 2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                offset += 4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                offset += 8
+
+    def subset(self, glyphs):
+        """The font with the outlines of ``glyphs`` only.
+
+        The other glyphs keep their ids, which the document uses as CIDs,
+        but are left empty; tables for text layout are dropped.
+        """
+        count = len(self.glyph_offsets) - 1
+        kept, pending = set(), [0, *glyphs]
+        while pending:
+            glyph = pending.pop()
+            if glyph not in kept and glyph < count:
+                kept.add(glyph)
+                pending.extend(self.components(glyph))
+
+        glyf, loca = bytearray(), []
+        start = self.tables['glyf']
+        for glyph in range(count):
+            loca.append(len(glyf))
+            if glyph in kept:
+                glyf += self.data[start + self.glyph_offsets[glyph]:
+                                  start + self.glyph_offsets[glyph + 1]]
+                glyf += bytes(-len(glyf) % 4)
+        loca.append(len(glyf))
+
+        tables = {
+            tag: self.table(tag) for tag in SUBSET_TABLES
+            if tag in self.tables
+        }
+        head = bytearray(tables['head'])
+        # Long offsets in loca.
+        struct.pack_into('>h', head, 50, 1)
+        tables.update(
+            head=bytes(head), glyf=bytes(glyf),
+            loca=struct.pack(f'>{len(loca)}I', *loca),
+        )
+        return build_font(tables)
+
+    def glyph(self, char):
+        return self.cmap.get(ord(char), 0)
+
+    def advance(self, glyph):
+        if glyph < len(self.advances):
+            return self.advances[glyph]
+        return self.advances[-1]
+
+    def width(self, text, size):
+        return sum(
+            self.advance(self.glyph(char)) for char in text
+        ) * size / 1000
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    return TrueTypeFont(path)
+
+
+class StreamingPDF:
+    def __init__(self, font_path):
+        self.font = load_font(font_path)
+        self.offset = 0
+        self.offsets = {}
+        self.next_object = TO_UNICODE + 1
+        self.pages = []
+        self.used_glyphs = {}
+        self.lines = []
+        self.lines_per_page = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+    def write(self, data):
+        self.offset += len(data)
+        return data
+
+    def write_object(self, number, body, stream=None):
+        self.offsets[number] = self.offset
+        if stream is not None:
+            body = body[:-2] + f' /Length {len(stream)} >>'.encode()
+            body += b'\nstream\n' + stream + b'\nendstream'
+        return self.write(f'{number} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    def allocate(self):
+        number = self.next_object
+        self.next_object += 1
+        return number
+
+    def wrap(self, text):
+        width = PAGE_WIDTH - 2 * MARGIN
+        line = ''
+        for word in text.split(' '):
+            candidate = f'{line} {word}' if line else word
+            if line and self.font.width(candidate, FONT_SIZE) > width:
+                yield line
+                line = word
+            else:
+                line = candidate
+        yield line
+
+    def encode(self, text):
+        glyphs = []
+        for char in text:
+            glyph = self.font.glyph(char)
+            self.used_glyphs[glyph] = char
+            glyphs.append(f'{glyph:04X}')
+        return ''.join(glyphs)
+
+    def start(self):
+        yield self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self.write_object(
+            CATALOG, f'<< /Type /Catalog /Pages {PAGES} 0 R >>'.encode()
+        )
+
+    def add_line(self, text):
+        """Adds a line of text, yielding a page once it is filled."""
+        for line in self.wrap(text):
+            self.lines.append(line)
+            if len(self.lines) == self.lines_per_page:
+                yield self.flush_page()
+
+    def flush_page(self):
+        commands = [
+            'BT',
+            f'/F1 {FONT_SIZE} Tf',
+            f'{LEADING} TL',
+            f'{MARGIN} {PAGE_HEIGHT - MARGIN} Td',
+        ]
+        commands.extend(f'<{self.encode(line)}> Tj T*' for line in self.lines)
+        commands.append('ET')
+        self.lines = []
+        content = zlib.compress('\n'.join(commands).encode())
+
+        page, stream = self.allocate(), self.allocate()
+        self.pages.append(page)
+        return self.write_object(
+            stream, b'<< /Filter /FlateDecode >>', content
+        ) + self.write_object(page, (
+            f'<< /Type /Page /Parent {PAGES} 0 R '
+            f'/MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 {FONT} 0 R >> >> '
+            f'/Contents {stream} 0 R >>'
+        ).encode())
+
+    def finish(self):
+        if self.lines or not self.pages:
+            yield self.flush_page()
+        font = self.font
+        glyphs = sorted(self.used_glyphs)
+        widths = ' '.join(
+            f'{glyph} [{font.advance(glyph)}]' for glyph in glyphs
+        )
+        yield self.write_object(PAGES, (
+            f'<< /Type /Pages /Count {len(self.pages)} /Kids ['
+            + ' '.join(f'{page} 0 R' for page in self.pages)
+            + '] >>'
+        ).encode())
+        yield self.write_object(FONT, (
+            f'<< /Type /Font /Subtype /Type0 /BaseFont /{FONT_NAME} '
+            f'/Encoding /Identity-H /DescendantFonts [{CID_FONT} 0 R] '
+            f'/ToUnicode {TO_UNICODE} 0 R >>'
+        ).encode())
+        yield self.write_object(CID_FONT, (
+            f'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{FONT_NAME} '
+            f'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) '
+            f'/Supplement 0 >> /FontDescriptor {DESCRIPTOR} 0 R '
+            f'/CIDToGIDMap /Identity /W [{widths}] >>'
+        ).encode())
+        yield self.write_object(DESCRIPTOR, (
+            f'<< /Type /FontDescriptor /FontName /{FONT_NAME} /Flags 32 '
+            f'/FontBBox [{" ".join(map(str, font.bbox))}] /ItalicAngle 0 '
+            f'/Ascent {font.ascent} /Descent {font.descent} '
+            f'/CapHeight {font.ascent} /StemV 80 '
+            f'/FontFile2 {FONT_FILE} 0 R >>'
+        ).encode())
+        font_file = font.subset(glyphs)
+        yield self.write_object(FONT_FILE, (
+            f'<< /Filter /FlateDecode /Length1 {len(font_file)} >>'
+        ).encode(), zlib.compress(font_file))
+        yield self.write_object(
+            TO_UNICODE, b'<< >>', self.to_unicode(glyphs).encode()
+        )
+
+        xref = self.offset
+        entries = ['0000000000 65535 f ']
+        entries.extend(
+            f'{self.offsets[number]:010d} 00000 n '
+            for number in range(1, self.next_object)
+        )
+        yield self.write((
+            f'xref\n0 {self.next_object}\n' + '\n'.join(entries) + '\n'
+            f'trailer\n<< /Size {self.next_object} /Root {CATALOG} 0 R >>\n'
+            f'startxref\n{xref}\n%%EOF\n'
+        ).encode())
+
+    def to_unicode(self, glyphs):
+        mappings = [
+            f'<{glyph:04X}> <{ord(self.used_glyphs[glyph]):04X}>'
+            for glyph in glyphs
+        ]
+        chunks = []
+        for start in range(0, len(mappings), 100):
+            chunk = mappings[start:start + 100]
+            chunks.append(
+                f'{len(chunk)} beginbfchar\n' + '\n'.join(chunk)
+                + '\nendbfchar'
+            )
+        return (
+            '/CIDInit /ProcSet findresource begin\n12 dict begin\n'
+            'begincmap\n/CIDSystemInfo << /Registry (Adobe) '
+            '/Ordering (UCS) /Supplement 0 >> def\n'
+            '/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n'
+            '1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n'
+            + '\n'.join(chunks)
+            + '\nendcmap\nCMapName currentdict /CMap defineresource pop\n'
+            'end\nend'
+        )
+
+
+def stream_pdf(lines, font_path):
+    """Yields a PDF document with ``lines`` of text as it is generated."""
+    document = StreamingPDF(font_path)
+    yield from document.start()
+    for line in lines:
+        yield from document.add_line(line)
+    yield from document.finish()
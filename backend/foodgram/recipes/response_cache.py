@@ -0,0 +1,131 @@
+"""Cache-aside for anonymous recipe list and detail responses.
+
+A cached response depends on a few scopes: every response on ``all``, a
+recipe on ``recipe:<id>``, a list filtered by author on ``author:<id>``, a
+list filtered by tags on ``tag:<slug>`` of each of them, any other list on
+``list``. The versions of these scopes are part of the cache key, so
+bumping a version when the changing transaction commits evicts exactly the
+responses depending on it; the rest expire after RECIPE_CACHE_TIMEOUT.
+
+Ingredient amounts are only written together with their recipe, whose save
+evicts it. Changes of tags, ingredients and authors, which rarely happen,
+evict everything.
+"""
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import catalog
+
+KEY_PREFIX = 'recipe_response'
+ALL = 'all'
+LIST = 'list'
+LIST_PARAMS = ('tags', 'tags_mode', 'author', 'page', 'limit')
+TAGS_MODES = ('any', 'all')
+SLUG = re.compile(r'[-\w]+')
+
+
+def version_key(scope):
+    return f'{KEY_PREFIX}_version:{scope}'
+
+
+def get_versions(scopes):
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    return [
+        versions[key] if key in versions else catalog.get_version(key)
+        for key in keys
+    ]
+
+
+def list_scopes(params):
+    """Normalized parameters of a list request and the scopes of its
+    response, or ``None`` if the request is not cached."""
+    if any(name not in LIST_PARAMS for name in params):
+        return None
+    tags = sorted({slug for slug in params.getlist('tags') if slug})
+    author = params.get('author', '')
+    page = params.get('page', '') or '1'
+    limit = params.get('limit', '')
+    tags_mode = params.get('tags_mode', '') or 'any'
+    if tags_mode not in TAGS_MODES:
+        return None
+    if not all(SLUG.fullmatch(slug) for slug in tags) or not all(
+            value.isdigit() for value in (author or '0', page, limit or '0')):
+        return None
+
+    normalized = [('page', int(page))]
+    if limit:
+        normalized.append(('limit', int(limit)))
+    if author:
+        normalized.append(('author', int(author)))
+        # The author's recipes are evicted whatever their tags are.
+        scopes = [ALL, f'author:{int(author)}']
+    elif tags:
+        scopes = [ALL] + [f'tag:{slug}' for slug in tags]
+    else:
+        scopes = [ALL, LIST]
+    normalized.extend(('tags', slug) for slug in tags)
+    if tags:
+        normalized.append(('tags_mode', tags_mode))
+    return normalized, scopes
+
+
+def cache_key(request, action, pk=None):
+    """Key of the cached response to ``request``, or ``None`` if the
+    response must not be cached."""
+    if request.method not in ('GET', 'HEAD') or (
+            request.user.is_authenticated):
+        return None
+    if action == 'list':
+        found = list_scopes(request.query_params)
+        if found is None:
+            return None
+        normalized, scopes = found
+    elif action == 'retrieve':
+        if request.query_params or not str(pk).isdigit():
+            return None
+        normalized, scopes = [('pk', int(pk))], [ALL, f'recipe:{int(pk)}']
+    else:
+        return None
+
+    parts = [
+        action, request.scheme, request.get_host(),
+        request.accepted_media_type,
+    ]
+    parts.extend(f'{name}={value}' for name, value in normalized)
+    parts.extend(
+        f'{scope}@{version}'
+        for scope, version in zip(scopes, get_versions(scopes))
+    )
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{digest}'
+
+
+def invalidate(scopes):
+    """Bumps the versions of ``scopes`` once the current transaction
+    commits, so that a response rendered before is not cached as new."""
+    keys = {version_key(scope) for scope in scopes}
+
+    def bump():
+        for key in keys:
+            catalog.bump_version(key)
+
+    transaction.on_commit(bump)
+
+
+def invalidate_recipe(recipe, tag_slugs=None):
+    """Evicts the responses showing ``recipe``, including the lists of its
+    current tags or of ``tag_slugs``."""
+    if tag_slugs is None:
+        tag_slugs = recipe.tags.values_list('slug', flat=True)
+    invalidate(
+        [LIST, f'recipe:{recipe.id}', f'author:{recipe.author_id}']
+        + [f'tag:{slug}' for slug in tag_slugs]
+    )
+
+
+def invalidate_all():
+    invalidate([ALL])
@@ -0,0 +1,209 @@
+"""Reproducible synthetic data for benchmarks and load testing.
+
+Popularity of authors, recipes and ingredients follows a power law: the
+rank of a picked object is ``n * random() ** skew``, so a handful of
+objects get most of the references, as on a real site. Rows are produced
+by generators and inserted in batches, so memory stays bounded by the id
+arrays of users and recipes.
+"""
+import json
+import os
+import random
+from array import array
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import (Bookmark, Follow, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, Tag)
+from . import cookable, response_cache, timeline
+from .counters import reconcile
+from .utils import bulk_create_returning_ids, rebuild_shopping_carts
+
+User = get_user_model()
+
+INGREDIENTS_FIXTURE = os.path.join(
+    settings.BASE_DIR, 'fixtures', 'ingredients_prepared.json'
+)
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+PASSWORD = 'benchmark'
+
+
+def load_ingredients():
+    if not Ingredient.objects.exists():
+        with open(INGREDIENTS_FIXTURE, encoding='utf-8') as fixture:
+            Ingredient.objects.bulk_create(
+                Ingredient(**item['fields']) for item in json.load(fixture)
+            )
+    return list(Ingredient.objects.order_by('id').values_list('id', flat=True))
+
+
+def load_tags():
+    for name, color, slug in TAGS:
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )
+    return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+
+class Seeder:
+    def __init__(self, seed=0, skew=2.0, batch_size=5000, log=None):
+        self.rng = random.Random(seed)
+        self.skew = skew
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.ingredient_ids = load_ingredients()
+        self.rng.shuffle(self.ingredient_ids)
+        self.tag_ids = load_tags()
+        self.user_ids = array('q')
+        self.recipe_ids = array('q')
+
+    def pick(self, ids):
+        return ids[int(len(ids) * self.rng.random() ** self.skew)]
+
+    def insert(self, model, objs, ignore_conflicts=False):
+        """Inserts ``objs`` batch by batch and returns the number of rows."""
+        total = 0
+        objs = iter(objs)
+        while True:
+            batch = list(islice(objs, self.batch_size))
+            if not batch:
+                return total
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts
+                )
+            total += len(batch)
+            self.log(f'{model._meta.verbose_name_plural}: {total}')
+
+    def insert_returning_ids(self, model, objs, ids):
+        """Like ``insert``, collecting ids of the new rows into ``ids``."""
+        objs = iter(objs)
+        while True:
+            batch = list(islice(objs, self.batch_size))
+            if not batch:
+                return
+            with transaction.atomic():
+                created = bulk_create_returning_ids(model, batch)
+            ids.extend(obj.pk for obj in created)
+            self.log(f'{model._meta.verbose_name_plural}: {len(ids)}')
+
+    def users(self, count):
+        password = make_password(PASSWORD)
+        offset = User.objects.count()
+        self.insert_returning_ids(User, (
+            User(email=f'user{i}@example.com', username=f'user{i}',
+                 first_name=f'Имя{i}', last_name=f'Фамилия{i}',
+                 password=password)
+            for i in range(offset, offset + count)
+        ), self.user_ids)
+
+    def recipes(self, count):
+        rng = self.rng
+        self.insert_returning_ids(Recipe, (
+            Recipe(name=f'Рецепт {i}', text=f'Описание рецепта {i}',
+                   author_id=self.pick(self.user_ids),
+                   cooking_time=rng.randint(5, 120))
+            for i in range(count)
+        ), self.recipe_ids)
+
+    def recipe_relations(self, min_ingredients=3, max_ingredients=12):
+        rng = self.rng
+
+        def ingredients():
+            for recipe_id in self.recipe_ids:
+                picked = {
+                    self.pick(self.ingredient_ids)
+                    for _ in range(rng.randint(min_ingredients,
+                                               max_ingredients))
+                }
+                for ingredient_id in picked:
+                    yield RecipeIngredient(
+                        recipe_id=recipe_id, ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500)
+                    )
+
+        def tags():
+            for recipe_id in self.recipe_ids:
+                for tag_id in rng.sample(self.tag_ids,
+                                         rng.randint(1, len(self.tag_ids))):
+                    yield Recipe.tags.through(
+                        recipe_id=recipe_id, tag_id=tag_id
+                    )
+
+        self.insert(RecipeIngredient, ingredients())
+        self.insert(Recipe.tags.through, tags())
+
+    def user_recipe_pairs(self, model, count):
+        """Active users pick popular recipes; duplicates are skipped."""
+        return self.insert(model, (
+            model(user_id=self.pick(self.user_ids),
+                  recipe_id=self.pick(self.recipe_ids))
+            for _ in range(count)
+        ), ignore_conflicts=True)
+
+    def follows(self, count):
+        def rows():
+            for _ in range(count):
+                follower_id = self.pick(self.user_ids)
+                followee_id = self.pick(self.user_ids)
+                if follower_id != followee_id:
+                    yield Follow(follower_id=follower_id,
+                                 followee_id=followee_id)
+
+        return self.insert(Follow, rows(), ignore_conflicts=True)
+
+    def run(self, users, recipes, bookmarks, carts, follows):
+        self.users(users)
+        self.recipes(recipes)
+        self.recipe_relations()
+        self.user_recipe_pairs(Bookmark, bookmarks)
+        self.user_recipe_pairs(ShoppingList, carts)
+        self.follows(follows)
+
+    def reconcile(self):
+        """Fills the counters, cart totals and timelines, which bulk inserts
+        skip."""
+        reconcile()
+        rows = rebuild_shopping_carts(self.batch_size)
+        timeline.rebuild()
+        cookable.invalidate()
+        response_cache.invalidate_all()
+        self.log(f'Счётчики пересчитаны, строк в списках покупок: {rows}')
+
+
+def seed_database(size, seed=0):
+    """Fills an empty database with ``size`` recipes and related rows.
+
+    Returns the most active user, who is guaranteed to have own recipes,
+    bookmarks, a shopping cart and subscriptions.
+    """
+    seeder = Seeder(seed=seed)
+    seeder.run(
+        users=max(size // 10, 3), recipes=size, bookmarks=size * 3,
+        carts=size, follows=size * 2,
+    )
+    viewer_id, followee_id = seeder.user_ids[0], seeder.user_ids[1]
+    for model in (Bookmark, ShoppingList):
+        model.objects.bulk_create(
+            [model(user_id=viewer_id, recipe_id=recipe_id)
+             for recipe_id in seeder.recipe_ids[-3:]],
+            ignore_conflicts=True,
+        )
+    Follow.objects.bulk_create(
+        [Follow(follower_id=viewer_id, followee_id=followee_id)],
+        ignore_conflicts=True,
+    )
+    if not Recipe.objects.filter(author_id=viewer_id).exists():
+        Recipe.objects.filter(id=seeder.recipe_ids[0]).update(
+            author_id=viewer_id
+        )
+    seeder.reconcile()
+    return User.objects.get(id=viewer_id)
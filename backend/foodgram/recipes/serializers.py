@@ -1,16 +1,22 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from . import cookable
+from .images import (RecipeImageField, file_hash, process_recipe_image,
+                     rendition_urls)
+from .metrics import TimedSerializerMixin
 from .models import (Ingredient, Recipe, RecipeIngredient,
                      Tag, Follow, Bookmark, ShoppingList)
-from .utils import recipe_add_tag_ingredient
+from .utils import (recipe_add_tag_ingredient, recipe_amounts,
+                    update_shopping_carts)
 
 User = get_user_model()
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -21,6 +27,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_authenticated:
             return Follow.objects.filter(
@@ -28,7 +36,7 @@ class CustomUserSerializer(UserSerializer):
             ).exists()
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit', )
@@ -51,14 +59,20 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image = RecipeImageField(required=False)
+    # The photo of a new recipe is required, unless it is uploaded right
+    # after creating the recipe to /api/recipes/{id}/image/.
+    image_upload = serializers.ChoiceField(
+        choices=('multipart',), write_only=True, required=False
+    )
+    image_renditions = serializers.SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients', many=True, read_only=True
@@ -71,11 +85,17 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_upload',
+            'image_renditions', 'text', 'cooking_time',
         )
         read_only_fields = ('author',)
 
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -83,7 +103,17 @@ class RecipeSerializer(serializers.ModelSerializer):
             user=request.user, recipe=obj.id
         ).exists()
 
+    def to_representation(self, instance):
+        # A recipe just created or updated has no prefetched ingredients.
+        prefetch_related_objects([instance], Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient'),
+        ))
+        return super().to_representation(instance)
+
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -104,14 +134,19 @@ class RecipeSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Количество должно быть больше 0'
                 )
+        if Ingredient.objects.filter(id__in=unique_ids).count() != len(
+            unique_ids
+        ):
+            raise serializers.ValidationError(
+                'Указан несуществующий ингредиент'
+            )
         attrs['ingredients'] = ingredients
 
         tag_ids = self.initial_data.get('tags')
-        for tag_id in tag_ids:
-            if not Tag.objects.filter(id=tag_id).exists():
-                raise serializers.ValidationError(
-                    'Указан несуществующий тег'
-                )
+        if Tag.objects.filter(id__in=tag_ids).count() != len(set(tag_ids)):
+            raise serializers.ValidationError(
+                'Указан несуществующий тег'
+            )
         attrs['tags'] = tag_ids
 
         cooking_time = attrs.get('cooking_time')
@@ -120,35 +155,85 @@ class RecipeSerializer(serializers.ModelSerializer):
                 'Время приготовления должно быть больше 0'
             )
 
+        image_upload = attrs.pop('image_upload', None)
+        if attrs.get('image'):
+            attrs['image_hash'] = file_hash(attrs['image'])
+        elif self.instance is None and image_upload is None:
+            raise serializers.ValidationError(
+                {'image': 'Обязательное поле.'}
+            )
         return attrs
 
+    @transaction.atomic
     def create(self, validated_data):
         tag_ids = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
+        process_recipe_image(recipe)
         recipe_add_tag_ingredient(recipe, tag_ids, ingredients)
+        cookable.recipe_changed(recipe.id, (), recipe_amounts(recipe.id))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tag_ids = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
+        old_amounts = recipe_amounts(instance.id)
         RecipeIngredient.objects.filter(recipe=instance).delete()
         recipe_add_tag_ingredient(instance, tag_ids, ingredients)
-        return super().update(instance, validated_data)
+        new_amounts = recipe_amounts(instance.id)
+        update_shopping_carts(instance.id, old_amounts, new_amounts)
+        cookable.recipe_changed(instance.id, old_amounts, new_amounts)
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            process_recipe_image(recipe)
+        return recipe
+
+
+class RecipeImageSerializer(serializers.ModelSerializer):
+    image = RecipeImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('image',)
+
+    def validate(self, attrs):
+        attrs['image_hash'] = file_hash(attrs['image'])
+        return attrs
+
+    def update(self, instance, validated_data):
+        recipe = super().update(instance, validated_data)
+        process_recipe_image(recipe)
+        return recipe
+
 
+class CookableRecipeSerializer(RecipeSerializer):
+    missing_ingredients = serializers.IntegerField(read_only=True)
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('missing_ingredients',)
+
+
+class RecipeMinifiedSerializer(TimedSerializerMixin,
+                               serializers.ModelSerializer):
+    image = RecipeImageField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time',)
+
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
 
 
 class FollowSerializer(serializers.ModelSerializer):
-    queryset = User.objects.all()
-    follower = serializers.PrimaryKeyRelatedField(queryset=queryset)
-    followee = serializers.PrimaryKeyRelatedField(queryset=queryset)
+    follower = serializers.PrimaryKeyRelatedField(
+        read_only=True, default=serializers.CurrentUserDefault()
+    )
+    followee = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.all()
+    )
 
     class Meta:
         model = Follow
@@ -162,22 +247,21 @@ class FollowSerializer(serializers.ModelSerializer):
         ]
 
     def validate(self, attrs):
-        follower = attrs.get('follower')
+        follower = self.context['request'].user
         followee = attrs.get('followee')
         if follower == followee:
             raise serializers.ValidationError('Нельзя подписаться на себя')
         return attrs
 
 
-class FolloweeSerializer(serializers.ModelSerializer):
-    email = serializers.ReadOnlyField(source='followee.email')
-    id = serializers.ReadOnlyField(source='followee.id')
-    username = serializers.ReadOnlyField(source='followee.username')
-    first_name = serializers.ReadOnlyField(source='followee.first_name')
-    last_name = serializers.ReadOnlyField(source='followee.last_name')
-    is_subscribed = serializers.ReadOnlyField(source='followee.is_subscribed')
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+class FolloweeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Followed author with the recent recipes attached as
+    ``recent_recipes`` by the view."""
+    is_subscribed = serializers.BooleanField(read_only=True, default=True)
+    recipes = RecipeMinifiedSerializer(
+        source='recent_recipes', many=True, read_only=True
+    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -186,19 +270,6 @@ class FolloweeSerializer(serializers.ModelSerializer):
             'is_subscribed', 'recipes', 'recipes_count',
         )
 
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        queryset = Recipe.objects.filter(author=obj.followee)
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit:
-            queryset = queryset[:int(recipes_limit)]
-        return RecipeMinifiedSerializer(
-            queryset, many=True, context={'request': request}
-        ).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.followee).count()
-
 
 class BookmarkSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
@@ -0,0 +1,110 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save, pre_delete)
+from django.dispatch import receiver
+
+from . import (catalog, counters, fulltext, ingredient_index, response_cache,
+               timeline)
+from .models import (Bookmark, Follow, Ingredient, Recipe, ShoppingList, Tag,
+                     User)
+from .utils import add_to_shopping_cart, remove_from_shopping_cart
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    catalog.invalidate()
+    transaction.on_commit(ingredient_index.invalidate)
+    response_cache.invalidate_all()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, **kwargs):
+    catalog.invalidate()
+    response_cache.invalidate_all()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logging in only updates last_login, which is not shown anywhere.
+    if not created and set(update_fields or ()) != {'last_login'}:
+        response_cache.invalidate_all()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    # Tags are set after a new recipe is saved.
+    response_cache.invalidate_recipe(instance, () if created else None)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    # Tags of the recipe are gone once it is deleted.
+    response_cache.invalidate_recipe(instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if reverse:
+        if action.startswith('post_'):
+            response_cache.invalidate_all()
+    elif action in ('post_add', 'post_remove'):
+        response_cache.invalidate_recipe(
+            instance,
+            Tag.objects.filter(id__in=pk_set).values_list('slug', flat=True)
+        )
+    elif action == 'pre_clear':
+        response_cache.invalidate_recipe(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Bookmark)
+@receiver(post_save, sender=ShoppingList)
+def counted_row_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.count_inserted(sender, [instance])
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Bookmark)
+@receiver(post_delete, sender=ShoppingList)
+def counted_row_deleted(sender, instance, **kwargs):
+    counters.count_deleted(sender, instance)
+
+
+@receiver(post_save, sender=ShoppingList)
+def cart_row_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.user_id and instance.recipe_id:
+        add_to_shopping_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def cart_row_deleting(sender, instance, **kwargs):
+    # Before the ingredients of a recipe deleted along with it are gone.
+    if instance.user_id and instance.recipe_id:
+        remove_from_shopping_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out([instance])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.follower_id, instance.followee_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.unfollowed(instance.follower_id, instance.followee_id)
+
+
+@receiver(post_migrate)
+def migrated(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        fulltext.install_sqlite_index(using)
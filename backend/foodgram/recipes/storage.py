@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Names every saved file after the SHA-256 of its content, keeping the
+    directory and the extension, and keeps the first file saved under a
+    name: a file with the same name already has the same content."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        name = os.path.join(directory, f'{hash_file(content)}{extension}')
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if not self.exists(name):
+            name = super()._save(name, content)
+        if hasattr(content, 'temporary_file_path'):
+            # The temporary file is moved into place or no longer needed.
+            content.close()
+        return name
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.db.backends.utils import CursorWrapper
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITransactionTestCase
+
+from foodgram.handlers import PinnedThreadASGIHandler
+from recipes.models import Ingredient, ShoppingList, Tag
+from recipes.tests.utils import clear_caches, create_recipe, create_user
+
+
+def record_sql_threads(idents):
+    """Records the thread of every query, whichever connection runs it."""
+    execute = CursorWrapper.execute
+
+    def record(cursor, *args, **kwargs):
+        idents.append(threading.get_ident())
+        return execute(cursor, *args, **kwargs)
+
+    return mock.patch.object(CursorWrapper, 'execute', record)
+
+
+def request(application, path, headers=()):
+    """Status, headers and body parts of a GET request to ``path``."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    path, _, query = path.partition('?')
+    return application({
+        'type': 'http', 'method': 'GET', 'path': path, 'root_path': '',
+        'query_string': query.encode(), 'headers': list(headers),
+    }, receive, send), messages
+
+
+def run(*requests):
+    async def main():
+        await asyncio.gather(*(coroutine for coroutine, _ in requests))
+    asyncio.run(main())
+    return [
+        (messages[0]['status'], dict(messages[0]['headers']),
+         [message.get('body', b'') for message in messages[1:]])
+        for _, messages in requests
+    ]
+
+
+class PinnedThreadASGIHandlerTests(APITransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        ShoppingList.objects.create(
+            user=self.user, recipe=create_recipe(self.user, {flour: 200})
+        )
+        token = Token.objects.create(user=self.user)
+        self.auth = (b'authorization', f'Token {token.key}'.encode())
+
+    @override_settings(ASGI_THREADS=1)
+    def test_requests_share_the_pool(self):
+        handler = PinnedThreadASGIHandler()
+        responses = run(*(
+            request(handler, path) for path in
+            ('/api/tags/', '/api/ingredients/', '/api/tags/')
+        ))
+        for status, headers, body in responses:
+            self.assertEqual(status, 200)
+            self.assertEqual(headers[b'Content-Type'], b'application/json')
+            self.assertTrue(b''.join(body).startswith(b'[{"id":'))
+
+    def test_streaming_response_runs_in_one_thread(self):
+        threads = []
+        with record_sql_threads(threads):
+            [(status, headers, body)] = run(request(
+                PinnedThreadASGIHandler(),
+                '/api/recipes/download_shopping_cart/', [self.auth],
+            ))
+        self.assertEqual(status, 200)
+        self.assertEqual(b''.join(body).decode(), 'мука (г) — 200\n')
+        self.assertEqual(body[-1], b'')
+        self.assertGreater(len(threads), 1)
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
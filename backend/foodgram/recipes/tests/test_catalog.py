@@ -0,0 +1,65 @@
+import gzip
+import json
+import time
+from unittest import mock
+
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from recipes import catalog
+from recipes.models import Ingredient, Tag
+from recipes.tests.utils import clear_caches
+
+
+class CatalogTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    def setUp(self):
+        clear_caches()
+
+    def test_conditional_requests(self):
+        for path, name in (('/api/tags/', 'Завтрак'),
+                           ('/api/ingredients/', 'мука')):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()[0]['name'], name)
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+
+            response = self.client.get(
+                path, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            self.assertEqual(response.status_code, 304)
+            self.assertFalse(response.content)
+
+            response = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            data = json.loads(gzip.decompress(response.content))
+            self.assertEqual(data[0]['name'], name)
+
+    def test_version_outlives_default_timeout(self):
+        version = catalog.get_version()
+        later = time.time() + 24 * 60 * 60
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(catalog.get_version(), version)
+            self.assertEqual(catalog.bump_version(), version + 1)
+
+
+class CatalogVersionTests(APITransactionTestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_change_bumps_version_on_commit(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        version = catalog.get_version()
+
+        Tag.objects.create(name='Обед', slug='lunch')
+
+        self.assertGreater(catalog.get_version(), version)
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            [tag['slug'] for tag in response.json()], ['lunch']
+        )
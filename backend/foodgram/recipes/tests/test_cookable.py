@@ -0,0 +1,106 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.test import APITransactionTestCase
+
+from recipes import cookable
+from recipes.models import Ingredient, RecipeIngredient
+from recipes.tests.utils import clear_caches, create_recipe, create_user
+
+
+def patch_rebuild():
+    return mock.patch.object(cookable, 'rebuild_in_background')
+
+
+class CookableTests(APITransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        author = create_user('author')
+        self.flour, self.milk, self.eggs, self.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'яйца', 'соль')
+        )
+        self.pancakes = create_recipe(
+            author, {self.flour: 200, self.milk: 300, self.eggs: 2}
+        )
+        self.bread = create_recipe(author, {self.flour: 500, self.salt: 5})
+        self.omelette = create_recipe(author, {self.eggs: 3, self.milk: 50})
+
+    def cookable(self, *ingredients):
+        response = self.client.get('/api/recipes/cookable/', {
+            'ingredients': ','.join(str(item.id) for item in ingredients),
+        })
+        self.assertEqual(response.status_code, 200)
+        return [
+            (recipe['id'], recipe['missing_ingredients'])
+            for recipe in response.json()['results']
+        ]
+
+    def change_ingredients(self, recipe, amounts):
+        """Changes the ingredients of ``recipe`` the way the API does."""
+        with transaction.atomic():
+            old = list(recipe.recipe_ingredients.values_list(
+                'ingredient_id', flat=True
+            ))
+            recipe.recipe_ingredients.all().delete()
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=amount)
+                for ingredient, amount in amounts.items()
+            )
+            cookable.recipe_changed(recipe.id, old, [
+                ingredient.id for ingredient in amounts
+            ])
+
+    def test_fewest_missing_first(self):
+        self.assertEqual(self.cookable(self.eggs, self.milk), [
+            (self.omelette.id, 0), (self.pancakes.id, 1),
+        ])
+        self.assertEqual(self.cookable(self.flour), [
+            (self.bread.id, 1), (self.pancakes.id, 2),
+        ])
+        self.assertEqual(self.cookable(), [])
+
+    def test_invalid_ingredients(self):
+        response = self.client.get(
+            '/api/recipes/cookable/?ingredients=1,мука'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_worker_applies_changes_logged_by_others(self):
+        self.cookable(self.flour)
+        # Another worker's index, built before the change.
+        stale = cookable.build()
+        version = cookable._index_version
+
+        self.change_ingredients(self.bread, {self.flour: 500})
+        cookable._index, cookable._index_version = stale, version
+
+        # Long after the change, e.g. the first request in a day.
+        later = time.time() + 24 * 60 * 60
+        with mock.patch('time.time', return_value=later):
+            with patch_rebuild() as rebuild:
+                self.assertEqual(self.cookable(self.flour), [
+                    (self.bread.id, 0), (self.pancakes.id, 2),
+                ])
+        rebuild.assert_not_called()
+        self.assertIs(cookable._index, stale)
+
+    def test_missed_change_rebuilds_index_in_background(self):
+        self.cookable(self.flour)
+        stale = cookable.build()
+        version = cookable._index_version
+
+        self.change_ingredients(self.bread, {self.flour: 500})
+        cache.delete(f'{cookable.CHANGE_KEY}:{version + 1}')
+        cookable._index, cookable._index_version = stale, version
+
+        with mock.patch.object(cookable, '_built_at', 0), \
+                patch_rebuild() as rebuild:
+            # The old index is served until the new one is built.
+            self.assertEqual(self.cookable(self.flour), [
+                (self.bread.id, 1), (self.pancakes.id, 2),
+            ])
+        rebuild.assert_called_once()
@@ -0,0 +1,112 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes import counters
+from recipes.models import Bookmark, Follow, Ingredient, Recipe, ShoppingList
+from recipes.tests.utils import (User, authenticate, clear_caches,
+                                 create_recipe, create_user)
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        self.recipe = create_recipe(self.author, {self.ingredient: 100})
+        authenticate(self.client, self.user)
+
+    def assertCounts(self, obj, **counts):
+        obj.refresh_from_db()
+        for field, count in counts.items():
+            self.assertEqual(getattr(obj, field), count, field)
+
+    def add_followers(self, recipe, count, prefix):
+        """``count`` users who bookmarked ``recipe``, put it in their cart
+        and follow its author."""
+        users = [create_user(f'{prefix}{number}') for number in range(count)]
+        for model in (Bookmark, ShoppingList):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe) for user in users
+            )
+        Follow.objects.bulk_create(
+            Follow(follower=user, followee=recipe.author) for user in users
+        )
+        counters.reconcile()
+        return users
+
+    def test_counters_follow_rows(self):
+        self.assertCounts(self.author, recipes_count=1)
+        recipe_path = f'/api/recipes/{self.recipe.id}'
+        self.client.post(f'{recipe_path}/favorite/')
+        self.client.post(f'{recipe_path}/shopping_cart/')
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertCounts(
+            self.recipe, favorites_count=1, shopping_carts_count=1
+        )
+        self.assertCounts(self.author, followers_count=1)
+        self.assertCounts(self.user, following_count=1)
+
+        self.client.delete(f'{recipe_path}/favorite/')
+        self.client.delete(f'{recipe_path}/shopping_cart/')
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assertCounts(
+            self.recipe, favorites_count=0, shopping_carts_count=0
+        )
+        self.assertCounts(self.author, followers_count=0)
+        self.assertCounts(self.user, following_count=0)
+
+    def test_full_save_keeps_counters(self):
+        stale = Recipe.objects.get(id=self.recipe.id)
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        stale.name = 'Новое название'
+        stale.save()
+        self.assertCounts(
+            self.recipe, name='Новое название', favorites_count=1
+        )
+
+    def test_cascade_changes_counters_once(self):
+        queries = []
+        for count in (2, 20):
+            recipe = create_recipe(self.author, {self.ingredient: 10})
+            self.add_followers(recipe, count, f'fan{count}-')
+            with CaptureQueriesContext(connection) as captured:
+                Recipe.objects.filter(id=recipe.id).delete()
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertCounts(self.author, recipes_count=1, followers_count=22)
+
+    def test_deleted_user_leaves_other_counters_right(self):
+        fans = self.add_followers(self.recipe, 3, 'fan')
+        other = create_recipe(fans[0], {self.ingredient: 10})
+        Bookmark.objects.create(user=self.author, recipe=other)
+        Follow.objects.create(follower=self.author, followee=fans[0])
+
+        fans[0].delete()
+        User.objects.filter(id=fans[1].id).delete()
+
+        self.assertCounts(
+            self.recipe, favorites_count=1, shopping_carts_count=1
+        )
+        self.assertCounts(
+            self.author, recipes_count=1, followers_count=1,
+            following_count=0,
+        )
+        self.assertEqual(sum(counters.reconcile().values()), 0)
+
+    def test_reconcile_fixes_drifted_counters(self):
+        Follow.objects.create(follower=self.user, followee=self.author)
+        Recipe.objects.update(favorites_count=5)
+        User.objects.filter(id=self.author.id).update(
+            recipes_count=0, followers_count=3
+        )
+
+        fixed = counters.reconcile()
+
+        self.assertEqual(sum(fixed.values()), 3)
+        self.assertCounts(self.recipe, favorites_count=0)
+        self.assertCounts(self.author, recipes_count=1, followers_count=1)
+        self.assertEqual(sum(counters.reconcile().values()), 0)
@@ -0,0 +1,66 @@
+import re
+import unittest
+import zlib
+
+from rest_framework.test import APITestCase
+
+from recipes.exporters import pdf_export_available
+from recipes.models import Ingredient
+from recipes.tests.utils import (authenticate, clear_caches, content,
+                                 create_recipe, create_user)
+
+DOWNLOAD = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingCartExportTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        author = create_user('author')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        authenticate(self.client, self.user)
+        for amounts in ({flour: 200, milk: 300}, {flour: 500}):
+            recipe = create_recipe(author, amounts)
+            self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def download(self, path=DOWNLOAD, **headers):
+        response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response, content(response)
+
+    def test_txt(self):
+        response, body = self.download()
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(
+            body.decode(), 'молоко (мл) — 300\nмука (г) — 700\n'
+        )
+
+    def test_csv(self):
+        response, body = self.download(f'{DOWNLOAD}?format=csv')
+        self.assertEqual(
+            body.decode(),
+            '\ufeffИнгредиент,Единица измерения,Количество\r\n'
+            'молоко,мл,300\r\nмука,г,700\r\n',
+        )
+        self.assertIn('shoplist.csv', response['Content-Disposition'])
+
+    def test_unacceptable_format_falls_back_to_txt(self):
+        response, body = self.download(HTTP_ACCEPT='application/json')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('мука (г) — 700', body.decode())
+
+    @unittest.skipUnless(pdf_export_available(), 'Нет шрифта для PDF')
+    def test_pdf_embeds_used_glyphs_only(self):
+        response, body = self.download(HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(body.startswith(b'%PDF-1.4'))
+        self.assertTrue(body.endswith(b'%%EOF\n'))
+        font_length = int(re.search(rb'/Length1 (\d+)', body).group(1))
+        self.assertLess(font_length, 100 * 1024)
+        self.assertLess(len(body), 50 * 1024)
+
+        start = body.index(b'stream\n') + len(b'stream\n')
+        page = zlib.decompress(body[start:body.index(b'\nendstream')])
+        # The title and two lines of ingredients.
+        self.assertEqual(page.count(b'Tj'), 4)
@@ -0,0 +1,139 @@
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from recipes.models import Bookmark, Ingredient, ShoppingList, Tag
+from recipes.tests.utils import (authenticate, clear_caches, create_recipe,
+                                 create_user)
+
+
+class RecipeTagFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (('Завтрак', 'breakfast'), ('Обед', 'lunch'),
+                               ('Ужин', 'dinner'))
+        )
+        cls.porridge = create_recipe(author, {salt: 1}, [cls.breakfast])
+        cls.soup = create_recipe(author, {salt: 1}, [cls.lunch, cls.dinner])
+        cls.stew = create_recipe(author, {salt: 1}, [cls.dinner])
+
+    def setUp(self):
+        clear_caches()
+
+    def filter(self, query, status=200):
+        response = self.client.get(f'/api/recipes/?limit=50&{query}')
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def ids(self, query):
+        return [recipe['id'] for recipe in self.filter(query)['results']]
+
+    def test_any_of_the_tags(self):
+        self.assertEqual(self.ids('tags=dinner'), [
+            self.stew.id, self.soup.id,
+        ])
+        self.assertEqual(self.ids('tags=breakfast&tags=lunch'), [
+            self.soup.id, self.porridge.id,
+        ])
+        # A recipe with both tags is listed once.
+        data = self.filter('tags=lunch&tags=dinner&tags_mode=any')
+        self.assertEqual(data['count'], 2)
+
+    def test_all_of_the_tags(self):
+        self.assertEqual(
+            self.ids('tags=lunch&tags=dinner&tags_mode=all'), [self.soup.id]
+        )
+        self.assertEqual(
+            self.ids('tags=breakfast&tags=dinner&tags_mode=all'), []
+        )
+
+    def test_invalid_values(self):
+        for query, field in (('tags=brunch', 'tags'),
+                             ('tags=dinner&tags=brunch', 'tags'),
+                             ('tags=dinner&tags_mode=some', 'tags_mode')):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    list(self.filter(query, status=400)), [field]
+                )
+
+
+class NewTagFilterTests(APITransactionTestCase):
+    def test_new_tag_is_accepted(self):
+        clear_caches()
+        self.client.get('/api/recipes/?tags=brunch')
+        tag = Tag.objects.create(name='Бранч', slug='brunch')
+        recipe = create_recipe(create_user('author'), {}, [tag])
+
+        response = self.client.get('/api/recipes/?tags=brunch')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']], [recipe.id]
+        )
+
+
+class RecipeUserFlagTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('cook')
+        cls.other = create_user('other')
+        author = create_user('author')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.favorite, cls.planned, cls.other_favorite = (
+            create_recipe(author, {salt: 1}) for _ in range(3)
+        )
+        Bookmark.objects.bulk_create([
+            Bookmark(user=cls.user, recipe=cls.favorite),
+            Bookmark(user=cls.other, recipe=cls.other_favorite),
+        ])
+        ShoppingList.objects.bulk_create([
+            ShoppingList(user=cls.user, recipe=cls.planned),
+            ShoppingList(user=cls.other, recipe=cls.favorite),
+        ])
+
+    def setUp(self):
+        clear_caches()
+
+    def flags(self, query=''):
+        response = self.client.get(f'/api/recipes/?limit=50&{query}')
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe['id']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart']
+            )
+            for recipe in response.json()['results']
+        }
+
+    def test_flags_of_the_requesting_user(self):
+        authenticate(self.client, self.user)
+        self.assertEqual(self.flags(), {
+            self.favorite.id: (True, False),
+            self.planned.id: (False, True),
+            self.other_favorite.id: (False, False),
+        })
+        response = self.client.get(f'/api/recipes/{self.favorite.id}/')
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertFalse(response.json()['is_in_shopping_cart'])
+
+    def test_filters_of_the_requesting_user(self):
+        authenticate(self.client, self.user)
+        self.assertEqual(list(self.flags('is_favorited=1')), [
+            self.favorite.id,
+        ])
+        self.assertEqual(list(self.flags('is_in_shopping_cart=1')), [
+            self.planned.id,
+        ])
+        self.assertEqual(set(self.flags('is_favorited=0')), {
+            self.planned.id, self.other_favorite.id,
+        })
+        self.assertEqual(
+            list(self.flags('is_favorited=0&is_in_shopping_cart=0')),
+            [self.other_favorite.id],
+        )
+
+    def test_anonymous_user_has_no_flags(self):
+        self.assertEqual(set(self.flags().values()), {(False, False)})
+        self.assertEqual(self.flags('is_favorited=1'), {})
+        self.assertEqual(len(self.flags('is_in_shopping_cart=0')), 3)
@@ -0,0 +1,255 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APITestCase
+
+from recipes import images
+from recipes.images import RecipeImageField
+from recipes.models import Ingredient, Tag
+from recipes.storage import ContentAddressedStorage, hash_file
+from recipes.tests.utils import (authenticate, clear_caches, create_recipe,
+                                 create_user, png_base64, png_bytes)
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def stored(self, directory):
+        path = os.path.join(default_storage.location, directory)
+        return sorted(
+            os.path.relpath(os.path.join(root, name), path)
+            for root, _, names in os.walk(path) for name in names
+        )
+
+
+class RecipeImageFieldTests(TestCase):
+    def setUp(self):
+        self.field = RecipeImageField()
+
+    def assertRejected(self, data):
+        with self.assertRaises(serializers.ValidationError):
+            self.field.to_internal_value(data)
+
+    def test_named_after_content_hash(self):
+        image = self.field.to_internal_value(png_base64())
+        self.assertRegex(image.name, r'^[0-9a-f]{64}\.png$')
+        self.assertEqual(
+            self.field.to_internal_value(png_base64()).name, image.name
+        )
+
+    def test_uploaded_file(self):
+        image = self.field.to_internal_value(
+            SimpleUploadedFile('photo.JPG', png_bytes(image_format='JPEG'))
+        )
+        self.assertRegex(image.name, r'^[0-9a-f]{64}\.jpg$')
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1024)
+    def test_too_large_is_refused_before_decoding(self):
+        data = 'data:image/png;base64,' + 'A' * 2000
+        with mock.patch('recipes.images.a2b_base64') as decode:
+            self.assertRejected(data)
+        decode.assert_not_called()
+        self.assertRejected(
+            SimpleUploadedFile('photo.png', b'\0' * 2048)
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels(self):
+        self.assertRejected(png_base64(size=(20, 20)))
+
+    def test_invalid_images(self):
+        for data in ('data:image/png;base64,!!!!', 'data:,AAA',
+                     base64.b64encode(b'not an image').decode(),
+                     png_base64(image_format='BMP')):
+            with self.subTest(data=data[:40]):
+                self.assertRejected(data)
+
+    def test_chunked_decoding(self):
+        encoded = base64.encodebytes(png_bytes(size=(300, 300))).decode()
+        with mock.patch('recipes.images.BASE64_CHUNK_SIZE', 7):
+            image = self.field.to_internal_value(encoded)
+        self.assertEqual(image.read(), png_bytes(size=(300, 300)))
+
+
+class ContentAddressedStorageTests(MediaRootMixin, APITestCase):
+    def test_identical_content_is_stored_once(self):
+        storage = ContentAddressedStorage()
+        content = png_bytes()
+        digest = hash_file(ContentFile(content))
+
+        first = storage.save('photos/a.PNG', ContentFile(content))
+        second = storage.save('photos/b.png', ContentFile(content))
+        other = storage.save('photos/a.png', ContentFile(png_bytes(
+            color='#000000'
+        )))
+
+        self.assertEqual(first, f'photos/{digest}.png')
+        self.assertEqual(second, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(len(self.stored('photos')), 2)
+
+
+class RecipeImageRenditionTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.author = create_user('author')
+        authenticate(self.client, self.author)
+
+    def upload(self, recipe, content, name='photo.jpg'):
+        response = self.client.put(
+            f'/api/recipes/{recipe.id}/image/',
+            {'image': SimpleUploadedFile(name, content)},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_renditions(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90° clockwise.
+        Image.new('RGB', (2400, 1200), 'red').save(
+            buffer, 'JPEG', exif=exif
+        )
+        recipe = create_recipe(self.author, {})
+
+        data = self.upload(recipe, buffer.getvalue())
+
+        recipe.refresh_from_db()
+        self.assertEqual(len(recipe.image_hash), 64)
+        self.assertEqual(
+            recipe.image.name, f'recipes/images/{recipe.image_hash}.jpg'
+        )
+        self.assertEqual(set(data['image_renditions']), {
+            size for size, _ in images.RENDITIONS
+        })
+        for size, width in images.RENDITIONS:
+            for extension, image_format, _ in images.FORMATS:
+                name = images.rendition_name(
+                    recipe.image_hash, size, extension
+                )
+                self.assertEqual(
+                    data['image_renditions'][size][extension],
+                    f'http://testserver/media/{name}',
+                )
+                with default_storage.open(name) as image_file:
+                    rendition = Image.open(image_file)
+                    rendition.load()
+                self.assertEqual(rendition.format, image_format)
+                # Turned upright, the photo is taller than wide.
+                self.assertEqual(rendition.size, (width // 2, width))
+                self.assertFalse(rendition.getexif())
+                self.assertNotIn('icc_profile', rendition.info)
+
+    def test_identical_photos_are_stored_and_resized_once(self):
+        first, second = (create_recipe(self.author, {}) for _ in range(2))
+        content = png_bytes(size=(600, 400))
+
+        self.upload(first, content, 'one.png')
+        with mock.patch.object(images.ImageOps, 'exif_transpose') as decode:
+            data = self.upload(second, content, 'two.png')
+        decode.assert_not_called()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(second.image_hash, first.image_hash)
+        self.assertEqual(len(self.stored('recipes/images')), 1)
+        self.assertEqual(
+            len(self.stored('recipes/renditions')),
+            len(images.RENDITIONS) * len(images.FORMATS),
+        )
+        self.assertIn(first.image_hash, data['image_renditions']['card'][
+            'webp'
+        ])
+
+
+class RecipeImageUploadTests(MediaRootMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+        self.author = create_user('author')
+        self.tag = Tag.objects.create(name='Обед', slug='lunch')
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        authenticate(self.client, self.author)
+
+    def recipe_data(self, **fields):
+        return {
+            'ingredients': [{'id': self.salt.id, 'amount': 5}],
+            'tags': [self.tag.id],
+            'name': 'Суп',
+            'text': 'Посолить.',
+            'cooking_time': 30,
+            **fields,
+        }
+
+    def upload(self, recipe_id, content):
+        return self.client.put(
+            f'/api/recipes/{recipe_id}/image/',
+            {'image': SimpleUploadedFile('photo.png', content)},
+            format='multipart',
+        )
+
+    def test_image_is_required_on_create(self):
+        for fields in ({}, {'image': ''}, {'image_upload': 'ftp'}):
+            with self.subTest(fields=fields):
+                response = self.client.post(
+                    '/api/recipes/', self.recipe_data(**fields),
+                    format='json',
+                )
+                self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(image=png_base64()),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['image_renditions'])
+
+    def test_image_uploaded_after_create(self):
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(image_upload='multipart'),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertIsNone(data['image'])
+        self.assertIsNone(data['image_renditions'])
+        self.assertNotIn('image_upload', data)
+
+        response = self.upload(data['id'], png_bytes(size=(40, 40)))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['image_renditions'])
+
+        # An update without a photo keeps the uploaded one.
+        response = self.client.put(
+            f'/api/recipes/{data["id"]}/', self.recipe_data(name='Щи'),
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['image'])
+
+    def test_oversized_request_is_refused(self):
+        recipe = create_recipe(self.author, {})
+        with override_settings(RECIPE_REQUEST_MAX_SIZE=1024):
+            response = self.upload(recipe.id, png_bytes(size=(400, 400)))
+        self.assertEqual(response.status_code, 413)
@@ -0,0 +1,97 @@
+import io
+import json
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.tests.utils import clear_caches, create_user
+
+
+class ImportRecipesTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = create_user('partner')
+        self.salt = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        Tag.objects.create(name='Ужин', slug='dinner')
+
+    def record(self, **fields):
+        return {
+            'name': 'Суп', 'text': 'Сварить', 'cooking_time': 30,
+            'tags': ['dinner'],
+            'ingredients': [{'id': self.salt.id, 'amount': 5}],
+            **fields,
+        }
+
+    def run_import(self, lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as source:
+            source.write('\n'.join(
+                line if isinstance(line, str)
+                else json.dumps(line, ensure_ascii=False)
+                for line in lines
+            ))
+            source.flush()
+            stderr = io.StringIO()
+            try:
+                call_command(
+                    'import_recipes', source.name, author=self.author.email,
+                    stdout=io.StringIO(), stderr=stderr,
+                )
+            except CommandError:
+                pass
+        return stderr.getvalue()
+
+    def test_valid_records(self):
+        errors = self.run_import([
+            self.record(),
+            self.record(name='Паста', ingredients=[
+                {'name': 'соль', 'measurement_unit': 'г', 'amount': 2},
+            ], tags=[]),
+        ])
+        self.assertEqual(errors, '')
+        recipe = Recipe.objects.get(name='Суп')
+        self.assertEqual(recipe.author, self.author)
+        self.assertEqual(
+            list(recipe.tags.values_list('slug', flat=True)), ['dinner']
+        )
+        self.assertEqual(
+            list(recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+            [(self.salt.id, 5)],
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_bad_records_are_reported_and_skipped(self):
+        bad = [
+            '{"name": ',
+            '[1, 2]',
+            self.record(name='С' * 101),
+            self.record(name=['Суп']),
+            self.record(text={'ru': 'Сварить'}),
+            self.record(author=['partner@example.com']),
+            self.record(author='nobody@example.com'),
+            self.record(cooking_time=2 ** 31),
+            self.record(cooking_time=True),
+            self.record(ingredients=[{'id': [self.salt.id], 'amount': 1}]),
+            self.record(ingredients=[{'id': {'id': 1}, 'amount': 1}]),
+            self.record(ingredients=[{'name': 'соль',
+                                      'measurement_unit': ['г'],
+                                      'amount': 1}]),
+            self.record(ingredients=[{'id': self.salt.id, 'amount': -1}]),
+            self.record(ingredients={'id': self.salt.id}),
+            self.record(tags=[['dinner']]),
+            self.record(image=123),
+        ]
+        errors = self.run_import([self.record(), *bad, self.record()])
+
+        reported = [
+            int(line.split(':')[0].split()[1])
+            for line in errors.splitlines()
+        ]
+        self.assertEqual(sorted(reported), list(range(2, len(bad) + 2)))
+        self.assertEqual(Recipe.objects.count(), 2)
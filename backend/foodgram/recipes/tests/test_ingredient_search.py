@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from recipes import ingredient_index
+from recipes.models import Ingredient
+from recipes.tests.utils import clear_caches
+
+NAMES = (
+    'молоко', 'молоко козье', 'кокосовое молоко', 'сгущённое молоко',
+    'йогурт молочный', 'мука', 'ёрш', 'сахар', 'сахарная пудра',
+)
+
+
+def names(data):
+    return [ingredient['name'] for ingredient in data]
+
+
+class IngredientSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in NAMES
+        )
+
+    def setUp(self):
+        clear_caches()
+        ingredient_index.invalidate()
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return names(response.json())
+
+    def test_ranking(self):
+        # Name prefix, then word prefix, then substring, then typos.
+        self.assertEqual(self.search('молок'), [
+            'молоко', 'молоко козье', 'кокосовое молоко', 'сгущённое молоко',
+            'йогурт молочный',
+        ])
+        self.assertEqual(self.search('олоч'), ['йогурт молочный'])
+        self.assertEqual(self.search('мллоко')[:2], [
+            'молоко', 'молоко козье',
+        ])
+        self.assertEqual(self.search('Сахр'), ['сахар', 'сахарная пудра'])
+        self.assertEqual(self.search('xyz'), [])
+
+    def test_yo_is_e(self):
+        self.assertEqual(self.search('ерш'), ['ёрш'])
+        self.assertEqual(self.search('сгущен'), ['сгущённое молоко'])
+
+    def test_limit(self):
+        index = ingredient_index.get_index()
+        self.assertEqual(len(index.search('о', 2)), 2)
+        self.assertEqual(len(index.search('', 100)), len(NAMES))
+
+    def test_built_index_needs_no_query(self):
+        self.search('мука')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search('мука'), ['мука'])
+        self.assertEqual(len(queries), 0)
+
+
+class IngredientIndexInvalidationTests(APITransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        ingredient_index.invalidate()
+
+    def test_index_follows_catalog(self):
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertEqual(names(ingredient_index.search('со', 10)), ['соль'])
+
+        Ingredient.objects.create(name='соус', measurement_unit='мл')
+        salt.delete()
+
+        self.assertEqual(names(ingredient_index.search('со', 10)), ['соус'])
@@ -0,0 +1,98 @@
+import re
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes import metrics
+from recipes.models import Ingredient, ShoppingList
+from recipes.tests.utils import (authenticate, clear_caches, content,
+                                 create_recipe, create_user)
+
+SERVER_TIMING = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=([\d.]+), '
+    r'total;dur=([\d.]+)'
+)
+
+
+@override_settings(METRICS_TOKEN='')
+class MetricsTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        patcher = mock.patch.object(metrics, 'registry', metrics.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user('cook')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        ShoppingList.objects.create(
+            user=self.user, recipe=create_recipe(self.user, {flour: 200})
+        )
+
+    def metrics(self, **headers):
+        response = self.client.get('/api/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recipes/')
+        match = SERVER_TIMING.fullmatch(response['Server-Timing'])
+        self.assertIsNotNone(match)
+        self.assertEqual(int(match.group(1)), len(queries))
+        self.assertGreater(float(match.group(2)), 0)
+        self.assertGreaterEqual(float(match.group(3)), float(match.group(2)))
+
+    def test_histograms_per_route(self):
+        for _ in range(2):
+            self.client.get('/api/recipes/')
+        self.client.get('/api/recipes/0/')
+        authenticate(self.client, self.user)
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(content(response).decode(), 'мука (г) — 200\n')
+
+        text = self.metrics()
+
+        labels = 'route="recipes-list",method="GET"'
+        self.assertIn(
+            f'foodgram_request_duration_seconds_bucket{{{labels},'
+            f'le="+Inf"}} 2', text
+        )
+        self.assertIn(
+            f'foodgram_request_duration_seconds_count{{{labels}}} 2', text
+        )
+        self.assertIn(
+            'foodgram_responses_total{route="recipes-detail",method="GET",'
+            'status="404"} 1', text
+        )
+        self.assertIn(
+            'foodgram_request_duration_seconds_count{'
+            'route="recipes-download-shopping-cart",method="GET"} 1', text
+        )
+        buckets = [
+            int(count) for count in re.findall(
+                rf'_bucket{{{labels},le="[^"]+"}} (\d+)', text
+            )
+        ]
+        self.assertEqual(len(buckets), len(metrics.BUCKETS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_workers_are_summed(self):
+        self.client.get('/api/tags/')
+        other = metrics.Registry()
+        other.worker_key += ':other'
+        other.record('tags-list', 'GET', 200, 0.001, metrics.RequestTimings())
+        other.flush()
+
+        self.assertIn(
+            'foodgram_request_duration_seconds_count{route="tags-list",'
+            'method="GET"} 2', self.metrics()
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            response = self.client.get('/api/metrics', **headers)
+            self.assertEqual(response.status_code, 403)
+        self.metrics(HTTP_AUTHORIZATION='Bearer secret')
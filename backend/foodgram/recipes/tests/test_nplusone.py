@@ -0,0 +1,92 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes.models import Bookmark, Follow, Ingredient, Recipe
+from recipes.nplusone import NPlusOneDetected, QueryFingerprints, fingerprint
+from recipes.serializers import RecipeSerializer
+from recipes.tests.utils import (authenticate, clear_caches, create_recipe,
+                                 create_user)
+
+
+def favorited_one_by_one(serializer, obj):
+    return Bookmark.objects.filter(recipe=obj.id).exists()
+
+
+class NPlusOneTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = create_user('author')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        for _ in range(4):
+            create_recipe(self.author, {salt: 1})
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) "
+                        "AND name = 'Суп' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) "
+                        "AND name = 'Щи' LIMIT 3"),
+        )
+
+    def test_repeated_query_is_reported_with_its_stack(self):
+        fingerprints = QueryFingerprints(3)
+        with connection.execute_wrapper(fingerprints):
+            Recipe.objects.count()
+            for recipe in Recipe.objects.all():
+                Recipe.objects.filter(id=recipe.id).exists()
+        [(key, count, stack)] = fingerprints.repeated()
+        self.assertEqual(count, 4)
+        self.assertIn('LIMIT', key)
+        self.assertIn('test_nplusone.py', stack)
+        self.assertIn('выполнен 4 раз', fingerprints.report('test'))
+
+    @override_settings(NPLUSONE_MODE='raise')
+    def test_raise_mode_fails_request(self):
+        self.assertEqual(self.client.get('/api/recipes/').status_code, 200)
+        with mock.patch.object(
+                RecipeSerializer, 'get_is_favorited', favorited_one_by_one):
+            with self.assertRaises(NPlusOneDetected) as raised:
+                self.client.get('/api/recipes/?limit=4')
+        self.assertIn('favorited_one_by_one', str(raised.exception))
+
+    @override_settings(NPLUSONE_MODE='warn')
+    def test_warn_mode_logs(self):
+        with mock.patch.object(
+                RecipeSerializer, 'get_is_favorited', favorited_one_by_one):
+            with self.assertLogs('recipes.nplusone', 'WARNING') as logs:
+                response = self.client.get('/api/recipes/?limit=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /api/recipes/?limit=4', logs.output[0])
+
+
+class FollowSerializerTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        self.author = create_user('author')
+        authenticate(self.client, self.user)
+
+    def subscribe(self, user):
+        return self.client.post(f'/api/users/{user.id}/subscribe/')
+
+    def test_follower_is_the_requesting_user(self):
+        response = self.subscribe(self.author)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {
+            'follower': self.user.id, 'followee': self.author.id,
+        })
+        self.assertTrue(Follow.objects.filter(
+            follower=self.user, followee=self.author
+        ).exists())
+
+    def test_invalid_follows(self):
+        self.subscribe(self.author)
+        for user, message in ((self.author, 'Нельзя подписаться повторно'),
+                              (self.user, 'Нельзя подписаться на себя')):
+            response = self.subscribe(user)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['non_field_errors'], [message])
+        self.assertEqual(Follow.objects.count(), 1)
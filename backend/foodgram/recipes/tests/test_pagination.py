@@ -0,0 +1,83 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe
+from recipes.pagination import CustomPagination
+from recipes.tests.utils import clear_caches, create_recipe, create_user
+
+
+class CursorPaginationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        cls.recipes = [
+            create_recipe(cls.author, {cls.salt: 1}, name=f'Рецепт {number}')
+            for number in range(7)
+        ]
+        # Ties on pub_date are broken by id.
+        published = timezone.now() - timedelta(days=1)
+        Recipe.objects.filter(
+            id__in=[recipe.id for recipe in cls.recipes[2:5]]
+        ).update(pub_date=published)
+
+    def setUp(self):
+        clear_caches()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def expected_ids(self):
+        return list(
+            Recipe.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_pages_follow_each_other(self):
+        expected = self.expected_ids()
+        ids, url, pages = [], '/api/recipes/?limit=3&cursor=', 0
+        while url:
+            data = self.get(url)
+            self.assertNotIn('count', data)
+            ids.extend(recipe['id'] for recipe in data['results'])
+            url = data['next']
+            pages += 1
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_new_recipe_does_not_shift_pages(self):
+        expected = self.expected_ids()
+        first = self.get('/api/recipes/?limit=3&cursor=')
+        create_recipe(self.author, {self.salt: 1}, name='Новый')
+        clear_caches()
+
+        second = self.get(first['next'])
+
+        self.assertEqual(
+            [recipe['id'] for recipe in first['results'] + second['results']],
+            expected[:6],
+        )
+
+    def test_estimated_count(self):
+        data = self.get('/api/recipes/?limit=3&cursor=&count=estimate')
+        self.assertEqual(data['count'], len(self.recipes))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'WzFd', 'WyJ4IiwgInkiXQ=='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(CustomPagination, 'max_page_size', 2):
+            for path in ('/api/recipes/?limit=1000',
+                         '/api/recipes/?limit=1000&cursor='):
+                with self.subTest(path=path):
+                    self.assertEqual(len(self.get(path)['results']), 2)
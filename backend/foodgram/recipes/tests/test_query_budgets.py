@@ -0,0 +1,177 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.mixins import QueryBudgetExceeded
+from recipes.models import Bookmark, Follow, Recipe, ShoppingList, Tag
+from recipes.seeding import seed_database
+from recipes.tests.utils import authenticate, clear_caches
+from recipes.views import CustomUserViewSet, RecipeViewSet
+
+RECIPES = RecipeViewSet.query_budgets
+USERS = CustomUserViewSet.query_budgets
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True, NPLUSONE_MODE='raise')
+class QueryBudgetTests(APITestCase):
+    """Read endpoints return the expected data within their query budgets
+    and make no N+1 queries on a seeded database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = seed_database(60)
+        cls.recipe = Recipe.objects.order_by('id').first()
+        cls.tags = list(
+            Tag.objects.order_by('id').values_list('slug', flat=True)[:2]
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def get(self, path, budget):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        self.assertLessEqual(len(queries), budget, path)
+        return response.json()
+
+    def recipe_ids(self, queryset, limit=3):
+        return list(
+            queryset.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)[:limit]
+        )
+
+    def assertResults(self, data, queryset):
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            self.recipe_ids(queryset),
+        )
+
+    def assertRecipeLists(self, user=None):
+        recipes = Recipe.objects.all()
+
+        data = self.get('/api/recipes/', RECIPES['list'])
+        self.assertEqual(data['count'], recipes.count())
+        self.assertResults(data, recipes)
+
+        data = self.get('/api/recipes/?limit=12&page=2', RECIPES['list'])
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            self.recipe_ids(recipes, 24)[12:],
+        )
+
+        data = self.get('/api/recipes/?cursor=', RECIPES['list'])
+        self.assertNotIn('count', data)
+        self.assertResults(data, recipes)
+
+        tags = '&'.join(f'tags={slug}' for slug in self.tags)
+        data = self.get(f'/api/recipes/?{tags}', RECIPES['list'])
+        self.assertResults(
+            data, recipes.filter(tags__slug__in=self.tags).distinct()
+        )
+        data = self.get(
+            f'/api/recipes/?{tags}&tags_mode=all', RECIPES['list']
+        )
+        self.assertResults(
+            data, recipes.filter(tags__slug=self.tags[0])
+            .filter(tags__slug=self.tags[1])
+        )
+
+        author_id = self.recipe.author_id
+        data = self.get(f'/api/recipes/?author={author_id}', RECIPES['list'])
+        self.assertResults(data, recipes.filter(author_id=author_id))
+
+        data = self.get('/api/recipes/?search=рецепт', RECIPES['list'])
+        self.assertTrue(data['results'])
+        for recipe in data['results']:
+            self.assertIn('рецепт', (recipe['name'] + recipe['text']).lower())
+
+        data = self.get(
+            f'/api/recipes/{self.recipe.id}/', RECIPES['retrieve']
+        )
+        self.assertEqual(data['id'], self.recipe.id)
+        self.assertEqual(
+            sorted((item['id'], item['amount'])
+                   for item in data['ingredients']),
+            sorted(self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+        )
+        self.assertEqual(
+            data['is_favorited'],
+            Bookmark.objects.filter(user=user, recipe=self.recipe).exists(),
+        )
+
+        ingredients = set(self.recipe.recipe_ingredients.values_list(
+            'ingredient_id', flat=True
+        ))
+        data = self.get(
+            '/api/recipes/cookable/?ingredients='
+            + ','.join(map(str, ingredients)),
+            RECIPES['cookable'],
+        )
+        self.assertEqual(data['results'][0]['id'], self.recipe.id)
+        self.assertEqual(data['results'][0]['missing_ingredients'], 0)
+
+    def test_anonymous_reads(self):
+        self.assertRecipeLists()
+
+        data = self.get('/api/tags/', 2)
+        self.assertEqual(len(data), Tag.objects.count())
+        data = self.get('/api/ingredients/?name=мо', 2)
+        self.assertTrue(data)
+        for ingredient in data:
+            self.assertTrue(ingredient['name'].startswith('мо'))
+
+    def test_authenticated_reads(self):
+        authenticate(self.client, self.viewer)
+        self.assertRecipeLists(self.viewer)
+
+        favorites = Recipe.objects.filter(bookmarks__user=self.viewer)
+        data = self.get('/api/recipes/?is_favorited=1', RECIPES['list'])
+        self.assertResults(data, favorites)
+        self.assertTrue(all(
+            recipe['is_favorited'] for recipe in data['results']
+        ))
+
+        data = self.get(
+            '/api/recipes/?is_in_shopping_cart=0', RECIPES['list']
+        )
+        in_cart = ShoppingList.objects.filter(user=self.viewer)
+        self.assertResults(data, Recipe.objects.exclude(
+            id__in=in_cart.values('recipe_id')
+        ))
+        self.assertFalse(any(
+            recipe['is_in_shopping_cart'] for recipe in data['results']
+        ))
+
+        data = self.get('/api/recipes/timeline/', RECIPES['timeline'])
+        followees = set(Follow.objects.filter(
+            follower=self.viewer
+        ).values_list('followee_id', flat=True))
+        self.assertTrue(data['results'])
+        for recipe in data['results']:
+            self.assertIn(recipe['author']['id'], followees)
+
+        for path in ('/api/users/subscriptions/?limit=50&recipes_limit=3',
+                     '/api/users/subscriptions/?limit=50&cursor=&'
+                     'recipes_limit=3'):
+            data = self.get(path, USERS['subscriptions'])
+            self.assertEqual(
+                {author['id'] for author in data['results']}, followees
+            )
+            for author in data['results']:
+                self.assertLessEqual(len(author['recipes']), 3)
+                self.assertEqual(
+                    author['recipes_count'],
+                    Recipe.objects.filter(author_id=author['id']).count(),
+                )
+
+    def test_exceeded_budget_fails_request(self):
+        authenticate(self.client, self.viewer)
+        with mock.patch.dict(RecipeViewSet.query_budgets, {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/recipes/')
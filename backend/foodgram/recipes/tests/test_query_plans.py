@@ -0,0 +1,36 @@
+from django.db import connection
+from rest_framework.test import APITestCase
+
+from recipes.management.commands.explain_queries import Command, build_queries
+from recipes.models import Recipe
+from recipes.seeding import seed_database
+
+
+class QueryPlanTests(APITestCase):
+    """The queries behind the hot API paths read the large tables through
+    indexes on a seeded database, as ``explain_queries`` checks."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = seed_database(1000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.command = Command()
+
+    def scans(self, sql, params):
+        return self.command.full_scans(self.command.explain(sql, params))
+
+    def test_hot_queries_use_indexes(self):
+        queries = build_queries(self.viewer)
+        self.assertGreater(len(queries), 10)
+        for label, sql, params in queries:
+            with self.subTest(label):
+                self.assertEqual(self.scans(sql, params), [])
+
+    def test_full_scan_is_reported(self):
+        sql, params = Recipe.objects.filter(
+            text__contains='суп'
+        ).order_by().query.sql_with_params()
+        self.assertEqual(self.scans(sql, params), [Recipe._meta.db_table])
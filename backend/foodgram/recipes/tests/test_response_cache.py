@@ -0,0 +1,77 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITransactionTestCase
+
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.tests.utils import (authenticate, clear_caches, create_recipe,
+                                 create_user)
+
+
+class ResponseCacheTests(APITransactionTestCase):
+    """Anonymous responses are cached and evicted once changes commit."""
+
+    def setUp(self):
+        clear_caches()
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.tag = Tag.objects.create(name='Ужин', slug='dinner')
+        self.recipe = create_recipe(
+            self.author, {self.ingredient: 5}, [self.tag], name='Суп'
+        )
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_equivalent_lists_share_entry(self):
+        _, queries = self.get('/api/recipes/?tags=dinner&limit=6')
+        self.assertGreater(queries, 0)
+        _, queries = self.get('/api/recipes/?limit=6&page=1&tags=dinner')
+        self.assertEqual(queries, 0)
+
+    def test_authenticated_and_filtered_requests_bypass_cache(self):
+        self.get('/api/recipes/?search=суп')
+        _, queries = self.get('/api/recipes/?search=суп')
+        self.assertGreater(queries, 0)
+        authenticate(self.client, self.author)
+        self.get(f'/api/recipes/{self.recipe.id}/')
+        _, queries = self.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertGreater(queries, 0)
+
+    def test_changes_evict_responses(self):
+        detail = f'/api/recipes/{self.recipe.id}/'
+        for path in (detail, '/api/recipes/', '/api/recipes/?tags=dinner',
+                     f'/api/recipes/?author={self.author.id}'):
+            self.get(path)
+
+        self.recipe.name = 'Борщ'
+        self.recipe.save()
+
+        data, _ = self.get(detail)
+        self.assertEqual(data['name'], 'Борщ')
+        for path in ('/api/recipes/', '/api/recipes/?tags=dinner',
+                     f'/api/recipes/?author={self.author.id}'):
+            with self.subTest(path=path):
+                data, _ = self.get(path)
+                self.assertEqual(data['results'][0]['name'], 'Борщ')
+
+    def test_tag_change_evicts_tag_lists(self):
+        self.get('/api/recipes/?tags=dinner')
+        self.recipe.tags.clear()
+        data, _ = self.get('/api/recipes/?tags=dinner')
+        self.assertEqual(data['count'], 0)
+
+    def test_deleted_recipe_is_evicted(self):
+        detail = f'/api/recipes/{self.recipe.id}/'
+        self.get(detail)
+        self.get('/api/recipes/')
+
+        Recipe.objects.filter(id=self.recipe.id).delete()
+
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        data, _ = self.get('/api/recipes/')
+        self.assertEqual(data['count'], 0)
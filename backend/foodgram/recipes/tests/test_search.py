@@ -0,0 +1,48 @@
+from rest_framework.test import APITestCase
+
+from recipes.models import Ingredient, Recipe
+from recipes.tests.utils import clear_caches, create_recipe, create_user
+
+
+class RecipeSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.side = create_recipe(
+            author, {salt: 1}, name='Пампушки',
+            text='Чесночные пампушки подают к борщу.',
+        )
+        cls.borscht = create_recipe(
+            author, {salt: 1}, name='Борщ', text='Свекла, капуста, мясо.'
+        )
+        cls.salad = create_recipe(
+            author, {salt: 1}, name='Винегрет', text='Свекла и огурцы.'
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('борщ'), [
+            self.borscht.id, self.side.id,
+        ])
+
+    def test_all_words_are_required(self):
+        self.assertEqual(self.search('свекла огурцы'), [self.salad.id])
+        self.assertEqual(self.search('свекла'), [
+            self.salad.id, self.borscht.id,
+        ])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_index_follows_changes(self):
+        Recipe.objects.filter(id=self.salad.id).update(name='Борщ зелёный')
+        Recipe.objects.filter(id=self.borscht.id).delete()
+        clear_caches()
+
+        self.assertEqual(self.search('борщ'), [self.salad.id, self.side.id])
@@ -0,0 +1,116 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import (Ingredient, Recipe, ShoppingCartIngredient,
+                            ShoppingList, Tag)
+from recipes.tests.utils import (User, authenticate, clear_caches, content,
+                                 create_recipe, create_user)
+
+
+class ShoppingCartTotalsTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        self.author = create_user('author')
+        self.flour, self.milk, self.eggs = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('мука', 'г'), ('молоко', 'мл'),
+                               ('яйца', 'шт'))
+        )
+        self.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        self.pancakes = create_recipe(
+            self.author, {self.flour: 200, self.milk: 300}, [self.tag]
+        )
+        self.bread = create_recipe(self.author, {self.flour: 500})
+        authenticate(self.client, self.user)
+
+    def totals(self, user=None):
+        return dict(
+            ShoppingCartIngredient.objects.filter(user=user or self.user)
+            .values_list('ingredient__name', 'amount')
+        )
+
+    def version(self, user=None):
+        return User.objects.values_list(
+            'shopping_cart_version', flat=True
+        ).get(id=(user or self.user).id)
+
+    def download(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(response.status_code, 200)
+        return content(response).decode()
+
+    def fill_carts(self, *users):
+        for user in (self.user, *users):
+            for recipe in (self.pancakes, self.bread):
+                ShoppingList.objects.create(user=user, recipe=recipe)
+
+    def test_totals_follow_cart(self):
+        self.client.post(f'/api/recipes/{self.pancakes.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.bread.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {'мука': 700, 'молоко': 300})
+        self.assertIn('мука (г) — 700', self.download())
+
+        self.client.delete(f'/api/recipes/{self.pancakes.id}/shopping_cart/')
+        self.assertEqual(self.totals(), {'мука': 500})
+        self.assertNotIn('молоко', self.download())
+
+    def test_totals_follow_recipe_changes(self):
+        self.client.post(f'/api/recipes/{self.pancakes.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.bread.id}/shopping_cart/')
+        authenticate(self.client, self.author)
+        response = self.client.put(f'/api/recipes/{self.pancakes.id}/', {
+            'ingredients': [
+                {'id': self.flour.id, 'amount': 250},
+                {'id': self.eggs.id, 'amount': 2},
+            ],
+            'tags': [self.tag.id],
+            'name': 'Блины',
+            'text': 'Без молока',
+            'cooking_time': 20,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), {'мука': 750, 'яйца': 2})
+
+        self.client.delete(f'/api/recipes/{self.bread.id}/')
+        self.assertEqual(self.totals(), {'мука': 250, 'яйца': 2})
+
+    def test_orm_deletes_keep_totals(self):
+        """Deletes outside of the API, e.g. from the admin, change the
+        totals and the cart versions too."""
+        other = create_user('other')
+        self.fill_carts(other)
+        self.assertEqual(self.totals(other), {'мука': 700, 'молоко': 300})
+        version = self.version()
+        self.assertIn('мука (г) — 700', self.download())
+
+        Recipe.objects.filter(id=self.pancakes.id).delete()
+
+        for user in (self.user, other):
+            self.assertEqual(self.totals(user), {'мука': 500})
+        self.assertGreater(self.version(), version)
+        self.assertEqual(self.download(), 'мука (г) — 500\n')
+
+        ShoppingList.objects.filter(user=other).delete()
+        self.assertEqual(self.totals(other), {})
+        self.assertEqual(self.totals(), {'мука': 500})
+
+    def test_deleted_author_empties_carts(self):
+        self.fill_carts()
+        self.author.delete()
+        self.assertEqual(self.totals(), {})
+        self.assertEqual(self.download(), '')
+
+    def test_cascade_changes_totals_once(self):
+        queries = []
+        for count in (2, 12):
+            users = [create_user(f'cook{count}-{n}') for n in range(count)]
+            recipe = create_recipe(self.author, {self.flour: 1, self.eggs: 1})
+            ShoppingList.objects.bulk_create(
+                ShoppingList(user=user, recipe=recipe) for user in users
+            )
+            with CaptureQueriesContext(connection) as captured:
+                recipe.delete()
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
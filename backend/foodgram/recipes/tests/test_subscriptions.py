@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import Follow, Ingredient
+from recipes.tests.utils import (authenticate, clear_caches, create_recipe,
+                                 create_user)
+
+SUBSCRIPTIONS = '/api/users/subscriptions/'
+
+
+class SubscriptionsTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        self.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        self.authors = []
+        self.recipes = {}
+        authenticate(self.client, self.user)
+
+    def follow_authors(self, count, recipes=3):
+        for _ in range(count):
+            author = create_user(f'author{len(self.authors)}')
+            self.recipes[author.id] = [
+                create_recipe(author, {self.flour: 100}).id
+                for _ in range(recipes)
+            ][::-1]
+            Follow.objects.create(follower=self.user, followee=author)
+            self.authors.append(author)
+
+    def subscriptions(self, **params):
+        response = self.client.get(SUBSCRIPTIONS, {'limit': 50, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_followees_with_recent_recipes(self):
+        self.follow_authors(3)
+        other = create_user('stranger')
+        create_recipe(other, {self.flour: 1})
+        Follow.objects.create(follower=other, followee=self.authors[0])
+
+        results = self.subscriptions(recipes_limit=2)
+
+        self.assertEqual(
+            [author['id'] for author in results],
+            [author.id for author in reversed(self.authors)],
+        )
+        for author in results:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], 3)
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']],
+                self.recipes[author['id']][:2],
+            )
+
+    def test_without_valid_limit_all_recipes_are_listed(self):
+        self.follow_authors(2, recipes=4)
+        for recipes_limit in (None, 'много', 0):
+            params = {} if recipes_limit is None else {
+                'recipes_limit': recipes_limit
+            }
+            for author in self.subscriptions(**params):
+                self.assertEqual(
+                    [recipe['id'] for recipe in author['recipes']],
+                    self.recipes[author['id']],
+                )
+
+    def test_query_count_does_not_grow_with_authors(self):
+        self.subscriptions()
+        queries = []
+        for count in (2, 8):
+            self.follow_authors(count)
+            with CaptureQueriesContext(connection) as captured:
+                results = self.subscriptions(recipes_limit=2)
+            self.assertEqual(len(results), len(self.authors))
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
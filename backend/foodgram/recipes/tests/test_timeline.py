@@ -0,0 +1,104 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes import timeline
+from recipes.models import Follow, Ingredient, TimelineEntry, User
+from recipes.tests.utils import (authenticate, clear_caches, create_recipe,
+                                 create_user)
+
+
+@override_settings(TIMELINE_CELEBRITY_FOLLOWERS=3, TIMELINE_BACKFILL=2)
+class TimelineTests(APITestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('cook')
+        self.author = create_user('author')
+        self.star = create_user('star')
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        authenticate(self.client, self.user)
+
+    def publish(self, author, count=1):
+        return [
+            create_recipe(author, {self.salt: 1}).id for _ in range(count)
+        ]
+
+    def follow(self, followee, *followers):
+        for follower in followers or (self.user,):
+            Follow.objects.create(follower=follower, followee=followee)
+
+    def add_fans(self, author, count):
+        fans = [
+            create_user(f'{author.username}-fan{n}') for n in range(count)
+        ]
+        self.follow(author, *fans)
+        return fans
+
+    def entries(self, user=None):
+        return set(TimelineEntry.objects.filter(
+            user=user or self.user
+        ).values_list('recipe_id', flat=True))
+
+    def timeline(self):
+        response = self.client.get('/api/recipes/timeline/?limit=50')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_follow_backfills_and_new_recipes_fan_out(self):
+        old = self.publish(self.author, 3)
+        self.publish(self.star)
+
+        self.follow(self.author)
+        self.assertEqual(self.entries(), set(old[1:]))
+
+        new = self.publish(self.author)
+        self.assertEqual(self.entries(), {*old[1:], *new})
+        self.assertEqual(self.timeline(), new + old[:0:-1])
+
+    def test_unfollow_cleans_up(self):
+        self.follow(self.author)
+        other = create_user('other')
+        self.follow(other)
+        kept = self.publish(other)
+        self.publish(self.author, 2)
+
+        Follow.objects.get(follower=self.user, followee=self.author).delete()
+
+        self.assertEqual(self.entries(), set(kept))
+        self.assertEqual(self.timeline(), kept)
+
+    def test_celebrity_recipes_are_merged_on_read(self):
+        self.add_fans(self.star, 2)
+        self.follow(self.star)
+        self.follow(self.author)
+        starred = self.publish(self.star, 2)
+        own = self.publish(self.author)
+
+        self.assertEqual(self.entries(), set(own))
+        self.assertEqual(self.timeline(), own + starred[::-1])
+
+    def test_former_celebrity_is_fanned_out(self):
+        fans = self.add_fans(self.star, 3)
+        self.follow(self.star)
+        recipes = self.publish(self.star, 3)
+        self.assertEqual(self.entries(), set())
+
+        User.objects.filter(id__in=[fan.id for fan in fans[:2]]).delete()
+
+        self.assertEqual(self.entries(), set(recipes[1:]))
+        self.assertEqual(self.entries(fans[2]), set(recipes[1:]))
+        self.assertEqual(self.timeline(), recipes[:0:-1])
+
+    def test_rebuild_matches_backfilled_timelines(self):
+        self.publish(self.author, 3)
+        self.add_fans(self.author, 1)
+        self.follow(self.author)
+        expected = set(TimelineEntry.objects.values_list('user', 'recipe'))
+
+        timeline.rebuild()
+
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', 'recipe')),
+            expected,
+        )
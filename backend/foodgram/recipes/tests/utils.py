@@ -0,0 +1,61 @@
+import base64
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes import cookable
+from recipes.models import Recipe, RecipeIngredient
+from users.authentication import token_cache
+
+User = get_user_model()
+
+
+def create_user(name):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, first_name=name,
+        last_name=name, password='Sup3r-secret',
+    )
+
+
+def create_recipe(author, amounts, tags=(), name='Рецепт', text='Текст'):
+    """Recipe of ``author`` with ``amounts`` ({ingredient: amount})."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=text, cooking_time=10
+    )
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in amounts.items()
+    )
+    return recipe
+
+
+def png_bytes(size=(8, 8), image_format='PNG', color='#E26C2D'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def png_base64(**kwargs):
+    encoded = base64.b64encode(png_bytes(**kwargs)).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def authenticate(client, user):
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+def content(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def clear_caches():
+    cache.clear()
+    token_cache.entries.clear()
+    cookable._index = None
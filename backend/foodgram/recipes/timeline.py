@@ -0,0 +1,175 @@
+"""Precomputed home timelines of recipes from followed authors.
+
+A new recipe is copied into the timeline of every follower of its author
+(fan-out on write), so reading a timeline is a range scan of the
+``(user, pub_date, recipe)`` index. Recipes of authors with at least
+``TIMELINE_CELEBRITY_FOLLOWERS`` followers are not copied; they are
+merged in when the timeline is read instead, and copied once the author
+falls below the threshold again.
+"""
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from users import deletion
+
+from .models import Follow, Recipe, TimelineEntry, User
+
+BATCH_SIZE = 1000
+
+
+def is_celebrity(followers_count):
+    return followers_count >= settings.TIMELINE_CELEBRITY_FOLLOWERS
+
+
+def insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipes):
+    """Copies new ``recipes`` into the timelines of their authors'
+    followers, skipping celebrity authors."""
+    recipes_by_author = {}
+    for recipe in recipes:
+        recipes_by_author.setdefault(recipe.author_id, []).append(recipe)
+    authors = [
+        author_id for author_id, followers_count in User.objects.filter(
+            id__in=recipes_by_author
+        ).values_list('id', 'followers_count')
+        if not is_celebrity(followers_count)
+    ]
+    follows = Follow.objects.filter(
+        followee_id__in=authors
+    ).values_list('follower_id', 'followee_id')
+    insert(
+        TimelineEntry(user_id=follower_id, recipe_id=recipe.id,
+                      author_id=author_id, pub_date=recipe.pub_date)
+        for follower_id, author_id in follows.iterator()
+        for recipe in recipes_by_author[author_id]
+    )
+
+
+def backfill(follower_id, author_id):
+    """Adds the latest recipes of a newly followed author."""
+    followers_count = User.objects.values_list(
+        'followers_count', flat=True
+    ).get(id=author_id)
+    if is_celebrity(followers_count):
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL]
+    insert(
+        TimelineEntry(user_id=follower_id, recipe_id=recipe_id,
+                      author_id=author_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes
+    )
+
+
+def backfill_followers(author_ids):
+    """Adds the latest recipes of ``author_ids`` to the timelines of all
+    their followers."""
+    recipes = {}
+    for recipe in Recipe.objects.latest_per_author(
+        author_ids, settings.TIMELINE_BACKFILL
+    ):
+        recipes.setdefault(recipe.author_id, []).append(recipe)
+    if not recipes:
+        return
+    follows = Follow.objects.filter(
+        followee_id__in=list(recipes)
+    ).values_list('follower_id', 'followee_id')
+    insert(
+        TimelineEntry(user_id=follower_id, recipe_id=recipe.id,
+                      author_id=author_id, pub_date=recipe.pub_date)
+        for follower_id, author_id in follows.iterator()
+        for recipe in recipes[author_id]
+    )
+
+
+def clean_up(follower_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=follower_id, author_id=author_id
+    ).delete()
+
+
+class Unfollows:
+    """Follows deleted in one delete operation, counted per author."""
+
+    def __init__(self):
+        self.removed = Counter()
+
+    def add(self, author_id):
+        self.removed[author_id] += 1
+
+    def apply(self):
+        """Backfills the followers of authors who are no longer celebrities
+        after the deletes; their recipes were never fanned out."""
+        followers = dict(
+            Follow.objects.filter(followee_id__in=list(self.removed))
+            .values_list('followee_id').annotate(total=Count('id'))
+            .order_by()
+        )
+        former_celebrities = []
+        for author_id, removed in self.removed.items():
+            count = followers.get(author_id, 0)
+            if is_celebrity(count + removed) and not is_celebrity(count):
+                former_celebrities.append(author_id)
+        if former_celebrities:
+            backfill_followers(former_celebrities)
+
+
+def unfollowed(follower_id, author_id):
+    """Removes the recipes of an unfollowed author from the timeline of
+    the follower, right after the follow was deleted."""
+    clean_up(follower_id, author_id)
+    unfollows = deletion.pending('timeline_unfollows', Unfollows)
+    if unfollows is not None:
+        unfollows.add(author_id)
+    else:
+        unfollows = Unfollows()
+        unfollows.add(author_id)
+        unfollows.apply()
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Refills every timeline with the latest recipes of followed authors,
+    e.g. after recipes or follows were inserted in bulk."""
+    TimelineEntry.objects.all().delete()
+    authors = User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lt=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).order_by('id').values_list('id', flat=True).iterator()
+    while True:
+        author_ids = list(islice(authors, batch_size))
+        if not author_ids:
+            break
+        backfill_followers(author_ids)
+
+
+def home_timeline(queryset, user):
+    """Filters a recipe queryset down to the home timeline of ``user``,
+    newest first, with the timeline position annotated as ``feed_date``.
+    """
+    celebrities = list(Follow.objects.filter(
+        follower=user,
+        followee__followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).values_list('followee_id', flat=True))
+    if not celebrities:
+        queryset = queryset.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date')
+        )
+    else:
+        queryset = queryset.filter(
+            Q(author_id__in=celebrities) | Q(Exists(
+                TimelineEntry.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
+        ).annotate(feed_date=F('pub_date'))
+    return queryset.order_by('-feed_date', '-id')
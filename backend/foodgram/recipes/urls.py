@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
+from .metrics import metrics_view
 from .views import (IngredientViewSet, TagViewSet,
                     RecipeViewSet, CustomUserViewSet)
 
@@ -12,5 +13,6 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', CustomUserViewSet, basename='users')
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('', include(router.urls)),
 ]
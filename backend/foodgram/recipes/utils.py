@@ -1,18 +1,178 @@
-from rest_framework.generics import get_object_or_404
+from collections import Counter, defaultdict
+from itertools import islice
 
-from .models import Tag, RecipeIngredient
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from users import deletion
+
+from .models import RecipeIngredient, ShoppingCartIngredient, ShoppingList
+
+User = get_user_model()
 
 
 def recipe_add_tag_ingredient(recipe, tag_ids, ingredients):
+    """Sets recipe tags and adds ingredients in a fixed number of queries.
+
+    Must be called inside a transaction.
+    """
     if tag_ids:
-        for tag in recipe.tags.all():
-            recipe.tags.remove(tag)
-        for tag_id in tag_ids:
-            recipe.tags.add(get_object_or_404(Tag, id=tag_id))
+        recipe.tags.set(tag_ids)
 
-    for ingredient in ingredients:
-        RecipeIngredient.objects.create(
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
             recipe=recipe,
             ingredient_id=ingredient.get('id'),
             amount=ingredient.get('amount')
         )
+        for ingredient in ingredients
+    )
+
+
+def bulk_create_returning_ids(model, objs):
+    """``bulk_create`` which sets primary keys on every backend.
+
+    Backends which do not return ids from a bulk insert (SQLite) get them
+    read back by ``id`` greater than the last one, so the table must not be
+    written to concurrently, e.g. from a batch import or seeding.
+    """
+    last_id = (model.objects.order_by('-id')
+               .values_list('id', flat=True).first() or 0)
+    created = model.objects.bulk_create(objs)
+    if created and created[0].pk is None:
+        ids = (model.objects
+               .filter(id__gt=last_id)
+               .order_by('id')
+               .values_list('id', flat=True))
+        for obj, pk in zip(created, ids.iterator()):
+            obj.pk = pk
+    return created
+
+
+def recipe_amounts(recipe_id):
+    return dict(RecipeIngredient.objects
+                .filter(recipe_id=recipe_id)
+                .values_list('ingredient_id', 'amount'))
+
+
+def change_shopping_carts(user_ids, amounts):
+    """Adds ``amounts`` ({ingredient_id: delta}) to the shopping list
+    totals of the users and bumps their cart versions.
+
+    Must be called inside the transaction that changes the carts.
+    """
+    user_ids = list(user_ids)
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    if not user_ids:
+        return
+
+    if amounts:
+        ShoppingCartIngredient.objects.bulk_create(
+            [ShoppingCartIngredient(user_id=user_id,
+                                    ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, amount in amounts.items() if amount > 0],
+            ignore_conflicts=True,
+        )
+        totals = ShoppingCartIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts
+        )
+        totals.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        totals.filter(amount__lte=0).delete()
+
+    User.objects.filter(id__in=user_ids).update(
+        shopping_cart_version=F('shopping_cart_version') + 1
+    )
+
+
+def add_to_shopping_cart(user_id, recipe_id):
+    change_shopping_carts([user_id], recipe_amounts(recipe_id))
+
+
+class CartRemovals:
+    """Recipes removed from shopping carts, applied with one change of the
+    totals per distinct change."""
+
+    def __init__(self):
+        self.amounts = {}
+        self.recipes = defaultdict(list)
+
+    def add(self, user_id, recipe_id):
+        # Read before the recipe ingredients can be deleted with it.
+        if recipe_id not in self.amounts:
+            self.amounts[recipe_id] = recipe_amounts(recipe_id)
+        self.recipes[user_id].append(recipe_id)
+
+    def apply(self):
+        user_ids = defaultdict(list)
+        for user_id, recipe_ids in self.recipes.items():
+            amounts = Counter()
+            for recipe_id in recipe_ids:
+                amounts.subtract(self.amounts[recipe_id])
+            user_ids[frozenset(amounts.items())].append(user_id)
+        for amounts, ids in user_ids.items():
+            change_shopping_carts(ids, dict(amounts))
+
+
+def remove_from_shopping_cart(user_id, recipe_id):
+    """Removes the recipe from the cart totals before its cart row is
+    deleted, or once the delete operation deleting it ends."""
+    removals = deletion.pending('shopping_carts', CartRemovals)
+    if removals is not None:
+        removals.add(user_id, recipe_id)
+    else:
+        removals = CartRemovals()
+        removals.add(user_id, recipe_id)
+        removals.apply()
+
+
+def update_shopping_carts(recipe_id, old_amounts, new_amounts):
+    """Applies a change of recipe ingredients to every cart holding it."""
+    change_shopping_carts(
+        ShoppingList.objects
+        .filter(recipe_id=recipe_id)
+        .values_list('user_id', flat=True),
+        {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+    )
+
+
+def rebuild_shopping_carts(batch_size=1000):
+    """Recomputes the ingredient totals of every shopping cart, e.g. after
+    carts were filled in bulk. Returns the number of total rows."""
+    totals = (RecipeIngredient.objects
+              .filter(recipe__shopping_list__user__isnull=False)
+              .values_list('recipe__shopping_list__user', 'ingredient')
+              .annotate(amount=Sum('amount'))
+              .order_by())
+    rows = (
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for user_id, ingredient_id, amount in totals.iterator()
+    )
+    created = 0
+    with transaction.atomic():
+        ShoppingCartIngredient.objects.all().delete()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            ShoppingCartIngredient.objects.bulk_create(batch)
+            created += len(batch)
+        User.objects.update(
+            shopping_cart_version=F('shopping_cart_version') + 1
+        )
+    return created
@@ -1,53 +1,72 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, F, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from djoser.views import UserViewSet
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotAcceptable, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from . import ingredient_index
+from .cookable import rank_recipes, recipe_changed
+from .exporters import (EXPORTERS, cache_export, pdf_export_available,
+                        shopping_cart_cache_key, shopping_cart_ingredients)
 from .filters import RecipeFilter, IngredientFilter
+from .parsers import (BoundedFormParser, BoundedJSONParser,
+                      BoundedMultiPartParser)
 from .permissions import IsOwnerOrAdminOrReadOnly
-from .serializers import (RecipeSerializer,
+from .renderers import (CSVRenderer, ExportContentNegotiation, PDFRenderer,
+                        PlainTextRenderer)
+from .serializers import (RecipeSerializer, CookableRecipeSerializer,
+                          RecipeImageSerializer, RecipeMinifiedSerializer,
                           CustomUserSerializer, IngredientSerializer,
                           TagSerializer, FollowSerializer, FolloweeSerializer,
                           BookmarkSerializer, ShoppingListSerializer)
 
 from .models import (Ingredient, Recipe, Tag, Follow, Bookmark, ShoppingList)
-from .mixins import CustomCreateDeleteObjSerializerMixin
+from .timeline import home_timeline
+from .utils import recipe_amounts
+from .mixins import (CatalogListMixin, CustomCreateDeleteObjSerializerMixin,
+                     QueryBudgetMixin, ResponseCacheMixin)
 
 User = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(QueryBudgetMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsOwnerOrAdminOrReadOnly]
+    query_budgets = {
+        'subscriptions': 4,
+    }
+    cursor_orderings = {
+        'subscriptions': ('-follow_id',),
+    }
 
     @action(
         detail=True, methods=['post'], permission_classes=[IsAuthenticated]
     )
+    @transaction.atomic
     def subscribe(self, request, id=None):
         follower = request.user
         followee = get_object_or_404(User, id=id)
 
-        data = {
-            'follower': follower.id,
-            'followee': followee.id
-        }
-
         serializer = FollowSerializer(
-            data=data,
+            data={'followee': followee.id},
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer.save(follower=follower)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
+    @transaction.atomic
     def delete_subscribe(self, request, id=None):
         follow = get_object_or_404(
             Follow,
@@ -59,15 +78,38 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(follower=request.user)
+        queryset = User.objects.filter(
+            followee__follower=request.user
+        ).annotate(
+            follow_id=F('followee__id'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('-follow_id')
         page = self.paginate_queryset(queryset)
+
+        recipes = {author.id: [] for author in page}
+        for recipe in Recipe.objects.latest_per_author(
+            list(recipes), self.get_recipes_limit()
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in page:
+            author.recent_recipes = recipes[author.id]
+
         serializer = FolloweeSerializer(
             page, many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
 
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return recipes_limit if recipes_limit > 0 else None
+
 
 class RecipeViewSet(
+                    QueryBudgetMixin,
+                    ResponseCacheMixin,
                     viewsets.ModelViewSet,
                     CustomCreateDeleteObjSerializerMixin
 ):
@@ -75,10 +117,85 @@ class RecipeViewSet(
     serializer_class = RecipeSerializer
     filter_class = RecipeFilter
     permission_classes = [IsOwnerOrAdminOrReadOnly]
+    parser_classes = [
+        BoundedJSONParser, BoundedFormParser, BoundedMultiPartParser
+    ]
+    query_budgets = {
+        'list': 6,
+        'retrieve': 6,
+        'timeline': 7,
+        'cookable': 6,
+    }
+    cursor_orderings = {
+        'list': ('-pub_date', '-id'),
+        'timeline': ('-feed_date', '-id'),
+    }
+
+    def get_queryset(self):
+        user = self.request.user
+        return Recipe.objects.with_user_flags(user).with_related(user)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        recipe_changed(instance.id, recipe_amounts(instance.id), ())
+        instance.delete()
+
+    @action(
+        detail=True, methods=['put'],
+        parser_classes=[BoundedMultiPartParser]
+    )
+    def image(self, request, pk=None):
+        """Replaces the recipe photo with a file sent as multipart form
+        data, which is streamed to disk instead of decoded in memory."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        self.check_object_permissions(request, recipe)
+        serializer = RecipeImageSerializer(recipe, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(RecipeMinifiedSerializer(
+            recipe, context=self.get_serializer_context()
+        ).data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def timeline(self, request):
+        queryset = home_timeline(self.get_queryset(), request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def cookable(self, request):
+        """Recipes using the given ``ingredients``, the ones missing the
+        fewest other ingredients first."""
+        try:
+            ingredient_ids = {
+                int(ingredient_id)
+                for value in request.query_params.getlist('ingredients')
+                for ingredient_id in value.split(',') if ingredient_id
+            }
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Укажите id ингредиентов через запятую'}
+            )
+        ranked = rank_recipes(ingredient_ids, settings.COOKABLE_RESULTS_LIMIT)
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in page]
+        )
+        results = []
+        for recipe_id, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.missing_ingredients = missing
+                results.append(recipe)
+        serializer = CookableRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True, methods=['post'], permission_classes=[IsAuthenticated]
     )
@@ -99,40 +216,64 @@ class RecipeViewSet(
     def delete_shopping_cart(self, request, pk=None):
         return self.delete_obj(ShoppingList, request, pk)
 
-    @action(detail=False, permission_classes=[IsAuthenticated])
+    @action(
+        detail=False, permission_classes=[IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, PDFRenderer],
+        content_negotiation_class=ExportContentNegotiation,
+    )
     def download_shopping_cart(self, request):
-        ingredients = (Ingredient.objects
-                       .select_related('recipe_ingredients')
-                       .filter(recipes__shopping_list__user=request.user)
-                       .values('name', 'measurement_unit')
-                       .annotate(amount=Sum('recipe_ingredients__amount'))
-                       )
-        shopping_list = []
-        for ingredient in ingredients:
-            shopping_list += [
-                f"{ingredient['name']} "
-                f"({ingredient['measurement_unit']}) — "
-                f"{ingredient['amount']}"
-            ]
-
-        response = HttpResponse(
-            '\n'.join(shopping_list),
-            content_type='text/plain',
-            status=status.HTTP_200_OK)
-        response['Content-Disposition'] = 'attachment; filename="shoplist.txt"'
+        renderer = request.accepted_renderer
+        if renderer.format == 'pdf' and not pdf_export_available():
+            raise NotAcceptable('Выгрузка в PDF недоступна')
+
+        content_type = (
+            f'{renderer.media_type}; charset={renderer.charset}'
+            if renderer.charset else renderer.media_type
+        )
+        version = User.objects.values_list(
+            'shopping_cart_version', flat=True
+        ).get(id=request.user.id)
+        cache_key = shopping_cart_cache_key(
+            request.user.id, version, renderer.format
+        )
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(
+                content, content_type=content_type, status=status.HTTP_200_OK
+            )
+        else:
+            response = StreamingHttpResponse(
+                cache_export(cache_key, EXPORTERS[renderer.format](
+                    shopping_cart_ingredients(request.user)
+                )),
+                content_type=content_type,
+                status=status.HTTP_200_OK)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shoplist.{renderer.format}"'
+        )
 
         return response
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CatalogListMixin, viewsets.ModelViewSet):
+    catalog_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_class = IngredientFilter
     pagination_class = None
     permission_classes = [IsOwnerOrAdminOrReadOnly]
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(
+                name, settings.INGREDIENT_SEARCH_LIMIT
+            ))
+        return super().list(request, *args, **kwargs)
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogListMixin, viewsets.ModelViewSet):
+    catalog_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -23,7 +23,8 @@ class CustomUserAdmin(admin.ModelAdmin):
 
     list_display = (
         'email', 'username', 'first_name',
-        'last_name', 'is_admin', 'is_active'
+        'last_name', 'is_admin', 'is_active',
+        'recipes_count', 'followers_count',
     )
     list_filter = ('is_admin', 'email', 'username')
     fieldsets = (
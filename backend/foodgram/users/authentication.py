@@ -0,0 +1,122 @@
+"""Token authentication without a database query per request.
+
+Tokens are looked up in a small in-process LRU cache and, if
+``AUTH_TOKEN_SHARED_CACHE`` is on, in the Django cache, before the
+database. A token is evicted from this worker's LRU and from the shared
+cache when it is deleted (logout) and when its user is saved (password
+change, deactivation). Other workers may still accept it until their copy
+expires after ``AUTH_TOKEN_CACHE_TTL`` seconds.
+
+Counters and the shopping cart version of a cached user are deferred, so
+they are read from the database when used instead of from a copy up to
+``AUTH_TOKEN_CACHE_TTL`` seconds old.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+KEY_PREFIX = 'auth_token'
+
+
+class TokenCache:
+    """LRU of pickled tokens with their users, so that every request gets
+    its own copy of the user."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, user_id, pickled = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, token):
+        entry = (
+            time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL,
+            token.user_id, pickle.dumps(token),
+        )
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete_user(self, user_id):
+        """Evicts the tokens of a user, returns their keys."""
+        with self.lock:
+            keys = [
+                key for key, (_, entry_user_id, _) in self.entries.items()
+                if entry_user_id == user_id
+            ]
+            for key in keys:
+                del self.entries[key]
+        return keys
+
+
+token_cache = TokenCache()
+
+
+def cacheable(token):
+    """Copy of ``token`` whose user has its denormalized fields deferred."""
+    token = pickle.loads(pickle.dumps(token))
+    user = token.user
+    for name in user.denormalized_fields:
+        user.__dict__.pop(user._meta.get_field(name).attname, None)
+    return token
+
+
+def shared_key(key):
+    return f'{KEY_PREFIX}:{key}'
+
+
+def user_key(user_id):
+    return f'{KEY_PREFIX}_user:{user_id}'
+
+
+def invalidate_token(key, user_id):
+    token_cache.delete_user(user_id)
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        cache.delete_many([shared_key(key), user_key(user_id)])
+
+
+def invalidate_user(user_id):
+    keys = token_cache.delete_user(user_id)
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        key = cache.get(user_key(user_id))
+        if key is not None:
+            keys.append(key)
+        cache.delete_many(
+            [shared_key(key) for key in keys] + [user_key(user_id)]
+        )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None and settings.AUTH_TOKEN_SHARED_CACHE:
+            token = cache.get(shared_key(key))
+            if token is not None:
+                token_cache.set(key, token)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cached = cacheable(token)
+            token_cache.set(key, cached)
+            if settings.AUTH_TOKEN_SHARED_CACHE:
+                cache.set_many({
+                    shared_key(key): cached,
+                    user_key(user.id): key,
+                }, settings.AUTH_TOKEN_CACHE_TTL)
+        return token.user, token
@@ -0,0 +1,63 @@
+"""Delete operations whose signal receivers share their work.
+
+Deleting a row deletes the rows referencing it as well and sends
+``pre_delete`` and ``post_delete`` for every one of them. Receivers
+changing other rows (counters, shopping cart totals) add their changes
+to the ``pending`` change of the operation instead, which is applied
+once, with one statement per target, when the operation ends.
+
+Deletes through ``BatchedDeleteMixin`` models and ``BatchedDeleteQuerySet``
+querysets are such operations; outside of one ``pending`` returns None
+and receivers apply their changes right away.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import models, transaction
+
+_local = threading.local()
+
+
+@contextmanager
+def operation():
+    """Applies the changes pending from the deletes in the block when it
+    ends, in the same transaction. A nested block joins the outer one."""
+    if getattr(_local, 'changes', None) is not None:
+        yield
+        return
+    _local.changes = {}
+    try:
+        with transaction.atomic(savepoint=False):
+            yield
+            changes, _local.changes = _local.changes, None
+            for change in changes.values():
+                change.apply()
+    finally:
+        _local.changes = None
+
+
+def pending(key, factory):
+    """The change stored under ``key`` in the current delete operation,
+    made by ``factory`` when first asked for, or None outside of one.
+    The change is applied by calling its ``apply`` method."""
+    changes = getattr(_local, 'changes', None)
+    if changes is None:
+        return None
+    if key not in changes:
+        changes[key] = factory()
+    return changes[key]
+
+
+class BatchedDeleteQuerySet(models.QuerySet):
+    def delete(self):
+        with operation():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class BatchedDeleteMixin:
+    def delete(self, *args, **kwargs):
+        with operation():
+            return super().delete(*args, **kwargs)
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_auto_20220118_1956'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='customuser',
+            options={'ordering': ('-date_joined',), 'verbose_name': 'Пользователь', 'verbose_name_plural': 'Пользователи'},
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='shopping_cart_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия списка покупок'),
+        ),
+    ]
@@ -1,8 +1,37 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
+from .deletion import BatchedDeleteMixin, BatchedDeleteQuerySet
 
-class CustomUser(AbstractUser):
+
+class DenormalizedFieldsMixin:
+    """Leaves ``denormalized_fields`` out of full saves of existing rows.
+
+    Those fields are only changed by F() updates; writing back the values
+    loaded with the instance would undo updates committed since then.
+    """
+    denormalized_fields = ()
+
+    def save(self, *args, force_insert=False, update_fields=None,
+             **kwargs):
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.denormalized_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, force_insert=force_insert,
+                     update_fields=update_fields, **kwargs)
+
+
+class CustomUserManager(UserManager.from_queryset(BatchedDeleteQuerySet)):
+    pass
+
+
+class CustomUser(BatchedDeleteMixin, DenormalizedFieldsMixin, AbstractUser):
     username = models.CharField(
         max_length=254, unique=True, verbose_name='Логин'
     )
@@ -18,6 +47,25 @@ class CustomUser(AbstractUser):
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
+    shopping_cart_version = models.PositiveIntegerField(
+        default=0, verbose_name='Версия списка покупок'
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+
+    objects = CustomUserManager()
+
+    denormalized_fields = (
+        'shopping_cart_version', 'recipes_count', 'followers_count',
+        'following_count',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name',)
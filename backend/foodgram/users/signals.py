@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import authentication
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: authentication.invalidate_token(
+        instance.key, instance.user_id
+    ))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logging in only updates last_login, which tokens do not depend on.
+    if not created and set(update_fields or ()) != {'last_login'}:
+        transaction.on_commit(
+            lambda: authentication.invalidate_user(instance.id)
+        )
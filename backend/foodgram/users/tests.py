@@ -0,0 +1,128 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.authentication import token_cache
+
+User = get_user_model()
+
+
+def create_user(name, password='Old-secret1'):
+    return User.objects.create_user(
+        email=f'{name}@example.com', username=name, first_name=name,
+        last_name=name, password=password,
+    )
+
+
+def content(response):
+    if response.streaming:
+        return b''.join(response.streaming_content).decode()
+    return response.content.decode()
+
+
+class TokenCacheTests(APITransactionTestCase):
+    """Tokens are served from the cache and evicted once their deletion or
+    a change of their user commits."""
+
+    def setUp(self):
+        token_cache.entries.clear()
+        cache.clear()
+        self.user = create_user('cook')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        return response.status_code, len(queries)
+
+    def test_cached_token_needs_no_query(self):
+        self.assertEqual(self.get_me()[0], 200)
+        self.assertEqual(self.get_me(), (200, 0))
+
+    def test_logout_evicts_token(self):
+        self.get_me()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me()[0], 401)
+
+    def test_deactivation_evicts_token(self):
+        self.get_me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_me()[0], 401)
+
+    def test_login_keeps_token(self):
+        self.get_me()
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.get_me(), (200, 0))
+
+    def test_deleted_token_is_evicted(self):
+        self.get_me()
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get_me()[0], 401)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=-1)
+    def test_expired_token_is_read_again(self):
+        self.get_me()
+        self.assertGreater(self.get_me()[1], 0)
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        token_cache.entries.clear()
+        cache.clear()
+        self.user = create_user('cook')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.recipe = Recipe.objects.create(
+            author=create_user('author'), name='Блины', text='Тесто',
+            cooking_time=20,
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, amount=200,
+            ingredient=Ingredient.objects.create(
+                name='мука', measurement_unit='г'
+            ),
+        )
+
+    def shopping_cart_version(self):
+        return User.objects.values_list(
+            'shopping_cart_version', flat=True
+        ).get(id=self.user.id)
+
+    def test_cached_user_reads_counters_from_database(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        User.objects.filter(id=self.user.id).update(recipes_count=7)
+
+        user = token_cache.get(self.token.key).user
+
+        self.assertEqual(user.recipes_count, 7)
+
+    def test_password_change_keeps_shopping_cart_version(self):
+        self.assertNotIn(
+            'мука',
+            content(self.client.get('/api/recipes/download_shopping_cart/')),
+        )
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+        version = self.shopping_cart_version()
+
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'Old-secret1',
+            'new_password': 'New-secret2',
+        })
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.shopping_cart_version(), version)
+        self.assertIn(
+            'мука',
+            content(self.client.get('/api/recipes/download_shopping_cart/')),
+        )